@@ -1,10 +1,19 @@
-from .models import CustomUser, LeaveRequest, LeaveType, LeaveBalance
+from .models import CustomUser, LeaveRequest, LeaveType, LeaveBalance, Holiday
+from .ledger import save_leave
 from django.contrib import admin
 
 # Register your models here.
 admin.site.register(CustomUser)
 admin.site.register(LeaveType)
-admin.site.register(LeaveRequest)
 admin.site.register(LeaveBalance)
+admin.site.register(Holiday)
 
 
+# 🔹 Leave edits post to the balance ledger; deletes release their days
+#    through the post_delete handler in myapp.ledger
+@admin.register(LeaveRequest)
+class LeaveRequestAdmin(admin.ModelAdmin):
+    exclude = ("days",)  # counted by the ledger
+
+    def save_model(self, request, obj, form, change):
+        save_leave(obj)
@@ -3,3 +3,6 @@ from django.apps import AppConfig
 class MyappConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'myapp'
+
+    def ready(self):
+        from . import availability, checks, hierarchy, ledger, work_calendar  # noqa: F401  (registers checks and signal handlers)
@@ -0,0 +1,206 @@
+#availability.py
+"""
+Leave interval lookups and the per-project daily absence headcount.
+
+The lookups are range predicates on the indexed (start_date, end_date)
+columns of LeaveRequest, so they never load a user's full leave history.
+ProjectAbsence holds, for every (project, date), how many members are on
+approved leave; it is updated by the ledger whenever a leave enters or
+leaves the Approved state, and by the ProjectMember signals below when
+someone joins or leaves a project.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .models import CustomUser, LeaveRequest, Project, ProjectAbsence, ProjectMember
+
+ACTIVE_STATUSES = ("Pending", "Approved")
+COVERAGE_MAX_DAYS = 366  # widest window a coverage request may ask for
+
+
+def find_overlapping_leave(user, start_date, end_date, exclude_id=None):
+    """
+    Returns the first pending/approved leave of `user` that overlaps
+    [start_date, end_date], or None.
+    """
+    qs = LeaveRequest.objects.filter(
+        user=user,
+        status__in=ACTIVE_STATUSES,
+        start_date__lte=end_date,
+        end_date__gte=start_date,
+    )
+    if exclude_id is not None:
+        qs = qs.exclude(id=exclude_id)
+    return qs.order_by("start_date").first()
+
+
+def users_out_on(project, day, statuses=("Approved",)):
+    """Members of `project` who have leave covering `day`."""
+    return CustomUser.objects.filter(
+        projectmember__project=project,
+        leaverequest__status__in=statuses,
+        leaverequest__start_date__lte=day,
+        leaverequest__end_date__gte=day,
+    ).distinct()
+
+
+def post_absence(user_id, start_date, end_date, delta):
+    """
+    Add delta (+1 on approval, -1 when an approved leave is withdrawn) to
+    every project of the user for each day in [start_date, end_date].
+    """
+    post_absences([(user_id, start_date, end_date)], delta)
+
+
+def post_absences(entries, delta, project_id=None):
+    """
+    post_absence for many (user_id, start_date, end_date) entries at once:
+    one membership query, one insert of missing rows, one locked read and
+    one bulk_update, however many leaves are posted. With `project_id`,
+    only that project is posted (membership changes).
+    """
+    entries = [e for e in entries if e[2] >= e[1]]
+    if not entries:
+        return
+
+    members = defaultdict(set)
+    if project_id is not None:
+        for entry in entries:
+            members[entry[0]].add(project_id)
+    else:
+        for user_id, member_project_id in ProjectMember.objects.filter(
+            user_id__in={e[0] for e in entries}
+        ).values_list("user_id", "project_id"):
+            members[user_id].add(member_project_id)
+
+    increments = defaultdict(int)
+    for user_id, start_date, end_date in entries:
+        for project_id in members[user_id]:
+            for i in range((end_date - start_date).days + 1):
+                increments[(project_id, start_date + timedelta(days=i))] += delta
+    if not increments:
+        return
+
+    project_ids = {pid for pid, _ in increments}
+    days = [day for _, day in increments]
+    with transaction.atomic():
+        if delta > 0:
+            # decrements never need new rows (and must not add any to a project being deleted)
+            ProjectAbsence.objects.bulk_create(
+                [ProjectAbsence(project_id=pid, date=day, count=0) for pid, day in increments],
+                ignore_conflicts=True,
+            )
+        changed = []
+        for row in ProjectAbsence.objects.select_for_update().filter(
+            project_id__in=project_ids, date__range=(min(days), max(days))
+        ):
+            n = increments.get((row.project_id, row.date))
+            if n:
+                row.count = max(row.count + n, 0)
+                changed.append(row)
+        ProjectAbsence.objects.bulk_update(changed, ["count"], batch_size=500)
+
+
+def _post_membership(user_id, project_id, delta):
+    """+1/-1 the user's approved leave on one project, unless another membership row still covers the pair."""
+    if ProjectMember.objects.filter(user_id=user_id, project_id=project_id).count() != (1 if delta > 0 else 0):
+        return
+    leaves = LeaveRequest.objects.filter(user_id=user_id, status="Approved").values_list("start_date", "end_date")
+    post_absences([(user_id, start, end) for start, end in leaves], delta, project_id=project_id)
+
+
+@receiver(pre_save, sender=ProjectMember)
+def _remember_membership(sender, instance, raw=False, **kwargs):
+    instance._previous_membership = None
+    if not raw and instance.pk is not None:
+        instance._previous_membership = ProjectMember.objects.filter(pk=instance.pk).values_list(
+            "user_id", "project_id"
+        ).first()
+
+
+@receiver(post_save, sender=ProjectMember)
+def _membership_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    current = (instance.user_id, instance.project_id)
+    previous = getattr(instance, "_previous_membership", None)
+    if not created and previous == current:
+        return
+    with transaction.atomic():
+        if previous is not None and previous != current:
+            _post_membership(*previous, -1)
+        _post_membership(*current, 1)
+
+
+@receiver(post_delete, sender=ProjectMember)
+def _membership_deleted(sender, instance, **kwargs):
+    _post_membership(instance.user_id, instance.project_id, -1)
+
+
+def rebuild_project_absence(project_ids=None):
+    """
+    Recompute ProjectAbsence from approved leaves with a sweep line
+    (+1 at each start, -1 the day after each end). Returns rows written.
+    """
+    memberships = ProjectMember.objects.all()
+    if project_ids is not None:
+        memberships = memberships.filter(project_id__in=project_ids)
+
+    members = defaultdict(set)
+    for user_id, project_id in memberships.values_list("user_id", "project_id"):
+        members[user_id].add(project_id)
+
+    events = defaultdict(lambda: defaultdict(int))
+    for user_id, start, end in LeaveRequest.objects.filter(
+        status="Approved", user_id__in=list(members)
+    ).values_list("user_id", "start_date", "end_date"):
+        for project_id in members[user_id]:
+            events[project_id][start] += 1
+            events[project_id][end + timedelta(days=1)] -= 1
+
+    rows = []
+    for project_id, deltas in events.items():
+        running = 0
+        points = sorted(deltas)
+        for day, next_day in zip(points, points[1:]):
+            running += deltas[day]
+            if running > 0:
+                rows.extend(
+                    ProjectAbsence(project_id=project_id, date=day + timedelta(days=i), count=running)
+                    for i in range((next_day - day).days)
+                )
+
+    with transaction.atomic():
+        stale = ProjectAbsence.objects.all()
+        if project_ids is not None:
+            stale = stale.filter(project_id__in=project_ids)
+        stale.delete()
+        ProjectAbsence.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
+
+
+def project_absence_series(project_ids, start_date, end_date):
+    """
+    {project_id: [{"date": ..., "out": n}, ...]} for days in
+    [start_date, end_date] where at least one member is out.
+    """
+    series = defaultdict(list)
+    for project_id, day, count in ProjectAbsence.objects.filter(
+        project_id__in=project_ids, date__range=(start_date, end_date), count__gt=0
+    ).order_by("project_id", "date").values_list("project_id", "date", "count"):
+        series[project_id].append({"date": day, "out": count})
+    return dict(series)
+
+
+def team_absence_context(project_ids, start_date, end_date):
+    """Absence series keyed by project name, small enough to hand to the chatbot."""
+    names = dict(Project.objects.filter(id__in=project_ids).values_list("id", "name"))
+    series = project_absence_series(list(names), start_date, end_date)
+    return [
+        {"project": names[pid], "members_out_per_day": days}
+        for pid, days in series.items()
+    ]
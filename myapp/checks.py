@@ -0,0 +1,57 @@
+#checks.py
+"""
+Database check: EXPLAIN the app's hot queries and warn when one of them is
+not served by the index added for it.
+
+Runs with `python manage.py check --database default` (e.g. against the
+MySQL deployment) and from myapp/tests.py.
+"""
+from django.core.checks import Tags, Warning, register
+from django.db import DatabaseError
+
+from .models import ChatHistory, LeaveRequest, Notification, ProjectMember
+
+# (index name, query builder) — one entry per hot access path
+HOT_QUERIES = [
+    # ledger / chatbot context / approvals
+    ("leave_user_status_idx",
+     lambda: LeaveRequest.objects.filter(user_id=1, status="Approved").values_list("start_date", "end_date")),
+    # pending_requests (HR queue)
+    ("leave_status_applied_idx",
+     lambda: LeaveRequest.objects.filter(status="Pending").order_by("-applied_at", "-id")[:26]),
+    # view_requests / manager_view_requests
+    ("leave_user_applied_idx",
+     lambda: LeaveRequest.objects.filter(user_id=1).order_by("-applied_at", "-id")[:26]),
+    # manager_dashboard notifications
+    ("notif_recipient_unread_idx",
+     lambda: Notification.objects.filter(recipient_id=1, is_read__in=[False]).order_by("-created_at")),
+    # chat_bot history
+    ("chat_user_timestamp_idx",
+     lambda: ChatHistory.objects.filter(user_id=1).order_by("-timestamp")[:5]),
+    # project__lead authorization joins
+    ("member_project_user_idx",
+     lambda: ProjectMember.objects.filter(project__lead_id=1).values_list("user_id", flat=True)),
+]
+
+
+def explain_hot_queries(using="default"):
+    """[(index name, plan text)] for every hot query."""
+    return [(index_name, build().using(using).explain()) for index_name, build in HOT_QUERIES]
+
+
+@register(Tags.database)
+def check_hot_query_indexes(app_configs, databases=None, **kwargs):
+    errors = []
+    for alias in databases or []:
+        try:
+            plans = explain_hot_queries(alias)
+        except DatabaseError:
+            continue  # tables not migrated yet
+        for index_name, plan in plans:
+            if index_name not in plan:
+                errors.append(Warning(
+                    f"Hot query expected to use {index_name} does not.",
+                    hint=plan,
+                    id="myapp.W001",
+                ))
+    return errors
@@ -0,0 +1,635 @@
+#compliance.py
+"""
+Non-compliance API client.
+
+ComplianceFetcher pulls day/page payloads concurrently: each HTTP call
+runs in a worker thread (asyncio.to_thread) behind a semaphore, so at most
+`concurrency` requests are in flight. 429 and 5xx responses (and
+connection errors / timeouts) are retried with exponential backoff,
+honouring Retry-After. Finished days are written with
+store_compliance_days(), one upsert per batch of days (sync_compliance).
+Each batch also updates UserData (users and the days they were
+non-compliant) and the NonCompliantDay fact table from the same payloads,
+so nothing re-crawls the API. The same batch refreshes the
+ComplianceDiscrepancy runs from its first day (see reconciliation.py).
+
+ComplianceRollup keeps one row per calendar day with running sums of
+the compliant / non-compliant counts, refreshed from the earliest day a
+batch touched; rolling_compliance() answers any window from two prefix
+rows instead of loading the window's records.
+
+dump_compliance() / load_compliance() (the dumpcompliance and
+loadcompliance commands) move whole days as NDJSON, one payload per line,
+so environments can be seeded offline through the same store path.
+
+Streaming mode (stream_compliance) is for days too large to hold: each
+page body is decoded incrementally (jsonstream.JSONArrayStream) and its
+users go straight into UserData / NonCompliantDay USER_DATES_CHUNK at a
+time, one day per transaction, so memory stays flat whatever the page
+size. Streamed days keep their users only in NonCompliantDay;
+ComplianceRecord.users is left empty.
+
+run_compliance_sync() is the incremental pipeline behind the
+sync_compliance command: it starts after the SyncCheckpoint high-water
+mark, so a nightly run fetches only the new days, and moves the mark
+forward as contiguous days are stored.
+
+Pagination contract of the API, per day:
+    GET <url>?date=YYYY-MM-DD&page=N&page_size=M   (header "token")
+    -> {"total_users", "compliant_users", "non_compliant_users",
+        "users": [...], "pagination": {"has_next", "total_pages"?, ...}}
+When the first page reports total_pages the remaining pages are fetched
+in parallel; otherwise has_next is followed page by page.
+"""
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+from datetime import date, datetime, timedelta
+
+import requests
+from django.db import connection, transaction
+from django.db.models import Max, Min, Q
+
+from .jsonstream import JSONArrayStream
+from .models import ComplianceRecord, ComplianceRollup, NonCompliantDay, SyncCheckpoint, UserData
+from .reconciliation import reconcile_compliance
+
+logger = logging.getLogger(__name__)
+
+API_URL = "https://aimanager.techjays.com/app/api/non-compliance/users/jaysone"
+PAGE_SIZE = 1000
+CONCURRENCY = 8
+MAX_RETRIES = 5
+BACKOFF_SECONDS = 0.5
+MAX_BACKOFF_SECONDS = 30
+TIMEOUT = (5, 30)  # connect, read
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+UPSERT_BATCH_DAYS = 30
+FACT_BATCH_SIZE = 5000
+USER_DATES_CHUNK = 1000
+STREAM_CHUNK_BYTES = 64 * 1024
+CHART_WINDOWS = (7, 30, 90, 180)
+ROLLUP_FIELDS = ["compliant_users", "non_compliant_users", "total_users", "cum_compliant", "cum_non_compliant"]
+SYNC_SOURCE = "non-compliance"
+SYNC_START = date(2025, 1, 1)  # first day of data when there is no checkpoint yet
+
+RECORD_FIELDS = ["total_users", "compliant_users", "non_compliant_users", "users", "pagination"]
+
+
+class ComplianceAPIError(Exception):
+    """The API kept failing (or answered with a non-retryable status) for a day/page."""
+
+
+def as_date(value):
+    return value if isinstance(value, date) else datetime.strptime(value, "%Y-%m-%d").date()
+
+
+def date_range(start, end):
+    start, end = as_date(start), as_date(end)
+    return [start + timedelta(days=i) for i in range((end - start).days + 1)]
+
+
+class ComplianceFetcher:
+    def __init__(self, url=API_URL, token=None, concurrency=CONCURRENCY, page_size=PAGE_SIZE,
+                 retries=MAX_RETRIES, backoff=BACKOFF_SECONDS, timeout=TIMEOUT):
+        self.url = url
+        self.token = token if token is not None else os.environ.get("SPARK_FINCH_KEY")
+        self.concurrency = concurrency
+        self.page_size = page_size
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.session = requests.Session()
+        self._semaphore = None
+
+    def _delay(self, attempt, response=None):
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after and retry_after.isdigit():
+            return min(int(retry_after), MAX_BACKOFF_SECONDS)
+        # full jitter keeps parallel retries from hitting the API in lockstep
+        return random.uniform(0, min(self.backoff * 2 ** attempt, MAX_BACKOFF_SECONDS))
+
+    async def fetch_page(self, day, page):
+        params = {"date": day.strftime("%Y-%m-%d"), "page": page, "page_size": self.page_size}
+        for attempt in range(self.retries + 1):
+            response = None
+            async with self._semaphore:
+                try:
+                    response = await asyncio.to_thread(
+                        self.session.get, self.url, headers={"token": self.token}, params=params,
+                        timeout=self.timeout,
+                    )
+                    if response.status_code == 200:
+                        # a truncated or non-JSON body is retried like a dropped connection
+                        payload = response.json()
+                        if not isinstance(payload, dict):
+                            raise ValueError("expected a JSON object")
+                        return payload
+                except (requests.RequestException, ValueError) as e:
+                    error = e
+                else:
+                    if response.status_code not in RETRY_STATUSES:
+                        raise ComplianceAPIError(f"{day} page {page}: HTTP {response.status_code}")
+                    error = f"HTTP {response.status_code}"
+            if attempt < self.retries:
+                delay = self._delay(attempt, response)
+                logger.info("Retrying %s page %s in %.1fs (%s)", day, page, delay, error)
+                await asyncio.sleep(delay)
+        raise ComplianceAPIError(f"{day} page {page}: gave up after {self.retries + 1} attempts ({error})")
+
+    def open_page(self, day, page):
+        """
+        Blocking GET of one page with the body left unread (stream=True), for
+        streaming mode. Retried like fetch_page until a 200 arrives; the
+        caller closes the response.
+        """
+        params = {"date": day.strftime("%Y-%m-%d"), "page": page, "page_size": self.page_size}
+        for attempt in range(self.retries + 1):
+            response = None
+            try:
+                response = self.session.get(
+                    self.url, headers={"token": self.token}, params=params, timeout=self.timeout, stream=True,
+                )
+            except requests.RequestException as e:
+                error = e
+            else:
+                if response.status_code == 200:
+                    return response
+                response.close()
+                if response.status_code not in RETRY_STATUSES:
+                    raise ComplianceAPIError(f"{day} page {page}: HTTP {response.status_code}")
+                error = f"HTTP {response.status_code}"
+            if attempt < self.retries:
+                delay = self._delay(attempt, response)
+                logger.info("Retrying %s page %s in %.1fs (%s)", day, page, delay, error)
+                time.sleep(delay)
+        raise ComplianceAPIError(f"{day} page {page}: gave up after {self.retries + 1} attempts ({error})")
+
+    async def fetch_day(self, day):
+        """All pages of one day merged into a single payload (users concatenated in page order)."""
+        first = await self.fetch_page(day, 1)
+        pages = [first]
+        pagination = first.get("pagination", {})
+        total_pages = pagination.get("total_pages")
+        if total_pages:
+            pages += await asyncio.gather(*(self.fetch_page(day, p) for p in range(2, int(total_pages) + 1)))
+        else:
+            page = 1
+            while pages[-1].get("pagination", {}).get("has_next", False):
+                page += 1
+                pages.append(await self.fetch_page(day, page))
+
+        users = []
+        for payload in pages:
+            users.extend(payload.get("users", []))
+        return {
+            "date": day,
+            "total_users": first.get("total_users", 0),
+            "compliant_users": first.get("compliant_users", 0),
+            "non_compliant_users": first.get("non_compliant_users", 0),
+            "users": users,
+            "pagination": pages[-1].get("pagination", {}),
+        }
+
+    async def fetch_days(self, days):
+        """Async iterator of day payloads in completion order; failed days are logged and skipped."""
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        tasks = [asyncio.ensure_future(self.fetch_day(day)) for day in days]
+        try:
+            for finished in asyncio.as_completed(tasks):
+                try:
+                    yield await finished
+                except ComplianceAPIError as e:
+                    logger.warning("Compliance fetch failed: %s", e)
+        finally:
+            for task in tasks:
+                task.cancel()
+
+
+def _conflict_target(fields):
+    # MySQL upserts on any unique key and rejects an explicit conflict target
+    return fields if connection.features.supports_update_conflicts_with_target else None
+
+
+def merge_user_dates(payloads):
+    """Add each payload's day to the UserData.dates of every user listed in it, creating missing users."""
+    seen = {}
+    for payload in payloads:
+        day = payload["date"].isoformat()
+        for user in payload["users"]:
+            user_id, email = user.get("id"), user.get("email")
+            if not user_id or not email:
+                continue
+            seen.setdefault(user_id, (email, set()))[1].add(day)
+    return upsert_user_dates(seen)
+
+
+def upsert_user_dates(seen, replace=False, chunk_size=USER_DATES_CHUNK):
+    """
+    Write {user_id: (email, {"YYYY-MM-DD", ...})} into UserData, chunk_size
+    users at a time: one read of the current dates and one
+    bulk_create(update_conflicts=True) per chunk. Dates are merged as sets
+    with what is stored (or replace it when `replace`). Returns rows written.
+    """
+    user_ids = sorted(seen)
+    written = 0
+    for i in range(0, len(user_ids), chunk_size):
+        chunk = user_ids[i:i + chunk_size]
+        current = {} if replace else dict(
+            UserData.objects.filter(user_id__in=chunk).values_list("user_id", "dates")
+        )
+        rows = []
+        for user_id in chunk:
+            email, days = seen[user_id]
+            stored = set(current.get(user_id) or ())
+            if user_id in current and days <= stored:
+                continue  # nothing new for this user
+            rows.append(UserData(user_id=user_id, email=email, dates=sorted(stored | days)))
+        UserData.objects.bulk_create(
+            rows, update_conflicts=True, unique_fields=_conflict_target(["user_id"]), update_fields=["dates"],
+        )
+        written += len(rows)
+    return written
+
+
+def rebuild_user_dates(chunk_size=USER_DATES_CHUNK):
+    """
+    Recompute UserData.dates from NonCompliantDay in one ordered pass.
+    Users without any NonCompliantDay rows are left as they are. Returns users written.
+    """
+    seen, written = {}, 0
+    rows = NonCompliantDay.objects.order_by("user_id", "date").values_list("user_id", "user__email", "date")
+    for user_id, email, day in rows.iterator(chunk_size=FACT_BATCH_SIZE):
+        if user_id not in seen and len(seen) >= chunk_size:
+            written += upsert_user_dates(seen, replace=True, chunk_size=chunk_size)
+            seen = {}
+        seen.setdefault(user_id, (email, set()))[1].add(day.isoformat())
+    written += upsert_user_dates(seen, replace=True, chunk_size=chunk_size)
+    return written
+
+
+def replace_non_compliant_days(payloads):
+    """Make NonCompliantDay match the payloads' user lists for exactly those days. Run after merge_user_dates."""
+    rows = sorted({
+        (payload["date"], user["id"])
+        for payload in payloads
+        for user in payload["users"]
+        if user.get("id") and user.get("email")
+    })
+    NonCompliantDay.objects.filter(date__in=[p["date"] for p in payloads]).delete()
+    NonCompliantDay.objects.bulk_create(
+        [NonCompliantDay(date=day, user_id=user_id) for day, user_id in rows], batch_size=FACT_BATCH_SIZE
+    )
+    return len(rows)
+
+
+def rebuild_non_compliant_days(batch_days=UPSERT_BATCH_DAYS):
+    """
+    Backfill NonCompliantDay (and UserData) from the users JSON already
+    stored on ComplianceRecord. Records without users (streamed days) are
+    skipped, so their facts are kept.
+    """
+    batch, total = [], 0
+    records = ComplianceRecord.objects.exclude(users=[]).only("date", "users").order_by("date")
+    for record in records.iterator(chunk_size=batch_days):
+        batch.append({"date": record.date, "users": record.users or []})
+        if len(batch) >= batch_days:
+            with transaction.atomic():
+                merge_user_dates(batch)
+                total += replace_non_compliant_days(batch)
+            batch = []
+    if batch:
+        with transaction.atomic():
+            merge_user_dates(batch)
+            total += replace_non_compliant_days(batch)
+    return total
+
+
+def store_compliance_days(payloads):
+    """
+    Upsert ComplianceRecord rows for a batch of day payloads in one
+    statement and fold the same payloads into UserData and NonCompliantDay
+    (then the rollups and the leave reconciliation from the first day on).
+    """
+    records = [ComplianceRecord(date=p["date"], **{f: p[f] for f in RECORD_FIELDS}) for p in payloads]
+    with transaction.atomic():
+        ComplianceRecord.objects.bulk_create(
+            records, update_conflicts=True, unique_fields=_conflict_target(["date"]),
+            update_fields=RECORD_FIELDS + ["updated_at"],
+        )
+        merge_user_dates(payloads)
+        replace_non_compliant_days(payloads)
+        since = min(p["date"] for p in payloads)
+        refresh_rollups(since)
+        reconcile_compliance(since)
+    return len(records)
+
+
+def sync_compliance(start, end, fetcher=None, store=store_compliance_days, batch_days=UPSERT_BATCH_DAYS):
+    """
+    Fetch every day from start to end (inclusive) concurrently and store it.
+    Returns days stored.
+
+    The event loop is stepped from this (sync) thread, so writes run here,
+    outside the loop, on the caller's DB connection and transaction; the
+    HTTP calls already in flight carry on in their threads meanwhile.
+    """
+    fetcher = fetcher or ComplianceFetcher()
+    loop = asyncio.new_event_loop()
+    payloads = fetcher.fetch_days(date_range(start, end))
+    stored, batch = 0, []
+    try:
+        while True:
+            try:
+                batch.append(loop.run_until_complete(payloads.__anext__()))
+            except StopAsyncIteration:
+                break
+            if len(batch) >= batch_days:
+                stored += store(batch)
+                batch = []
+        if batch:
+            stored += store(batch)
+    finally:
+        loop.run_until_complete(payloads.aclose())
+        loop.run_until_complete(loop.shutdown_default_executor())
+        loop.close()
+    return stored
+
+
+def _valid_users(users):
+    for user in users:
+        if user.get("id") and user.get("email"):
+            yield user
+
+
+def _store_user_chunk(day, users):
+    """Fold one chunk of a streamed day's users into UserData and NonCompliantDay."""
+    seen = {}
+    for user in users:
+        seen.setdefault(user["id"], (user["email"], set()))[1].add(day.isoformat())
+    upsert_user_dates(seen)
+    # a user can show up on two pages of the same day
+    NonCompliantDay.objects.bulk_create(
+        [NonCompliantDay(date=day, user_id=user_id) for user_id in seen], ignore_conflicts=True,
+    )
+
+
+def store_day_streaming(fetcher, day, chunk_size=USER_DATES_CHUNK):
+    """
+    Fetch one day page by page and write its users as they are decoded,
+    chunk_size at a time, in one transaction. At most one chunk of users is
+    held in memory. ComplianceRecord gets the day's counts with users=[].
+    """
+    with transaction.atomic():
+        NonCompliantDay.objects.filter(date=day).delete()
+        page, first = 1, None
+        while True:
+            with fetcher.open_page(day, page) as response:
+                stream = JSONArrayStream(response.iter_content(STREAM_CHUNK_BYTES), "users")
+                chunk = []
+                for user in _valid_users(stream):
+                    chunk.append(user)
+                    if len(chunk) >= chunk_size:
+                        _store_user_chunk(day, chunk)
+                        chunk = []
+                if chunk:
+                    _store_user_chunk(day, chunk)
+            envelope = stream.envelope
+            first = first or envelope
+            pagination = envelope.get("pagination", {})
+            total_pages = pagination.get("total_pages")
+            if (page < int(total_pages)) if total_pages else pagination.get("has_next", False):
+                page += 1
+                continue
+            break
+
+        ComplianceRecord.objects.bulk_create(
+            [ComplianceRecord(
+                date=day, total_users=first.get("total_users", 0), compliant_users=first.get("compliant_users", 0),
+                non_compliant_users=first.get("non_compliant_users", 0), users=[], pagination=pagination,
+            )],
+            update_conflicts=True, unique_fields=_conflict_target(["date"]), update_fields=RECORD_FIELDS + ["updated_at"],
+        )
+        refresh_rollups(day)
+        reconcile_compliance(day)
+
+
+def stream_compliance(start, end, fetcher=None, on_day=None):
+    """
+    Streaming counterpart of sync_compliance: days are fetched and stored one
+    at a time with store_day_streaming. A day whose body breaks off or does
+    not parse is retried from its first page (its transaction rolled back);
+    days that still fail are logged and skipped. on_day(day) runs after each
+    stored day. Returns days stored.
+    """
+    fetcher = fetcher or ComplianceFetcher()
+    stored = 0
+    for day in date_range(start, end):
+        for attempt in range(fetcher.retries + 1):
+            try:
+                store_day_streaming(fetcher, day)
+            except (requests.RequestException, ValueError) as e:
+                if attempt == fetcher.retries:
+                    logger.warning("Compliance stream failed: %s: %s", day, e)
+                    break
+                time.sleep(fetcher._delay(attempt))
+            except ComplianceAPIError as e:
+                logger.warning("Compliance fetch failed: %s", e)
+                break
+            else:
+                stored += 1
+                if on_day:
+                    on_day(day)
+                break
+    return stored
+
+
+def refresh_rollups(since=None):
+    """
+    Recompute ComplianceRollup from `since` (default: the first record) up
+    to the last ComplianceRecord day; running sums carry on from the row
+    before `since`. Returns rows written.
+    """
+    bounds = ComplianceRecord.objects.aggregate(first=Min("date"), last=Max("date"))
+    first, last = bounds["first"], bounds["last"]
+    if first is None:
+        ComplianceRollup.objects.all().delete()
+        return 0
+
+    previous = None
+    if since is not None and since > first:
+        previous = ComplianceRollup.objects.filter(date__lt=since).order_by("-date").first()
+        if previous is None:
+            since = first
+        elif previous.date < since - timedelta(days=1):
+            since = previous.date + timedelta(days=1)  # fill the gap since the last rolled-up day
+    else:
+        since = first
+    if since > last:
+        return 0
+
+    cum_compliant = previous.cum_compliant if previous else 0
+    cum_non_compliant = previous.cum_non_compliant if previous else 0
+    counts = {
+        day: (compliant, non_compliant, total)
+        for day, compliant, non_compliant, total in ComplianceRecord.objects.filter(date__gte=since).values_list(
+            "date", "compliant_users", "non_compliant_users", "total_users"
+        )
+    }
+    rows = []
+    for day in date_range(since, last):
+        compliant, non_compliant, total = counts.get(day, (0, 0, 0))
+        cum_compliant += compliant
+        cum_non_compliant += non_compliant
+        rows.append(ComplianceRollup(
+            date=day, compliant_users=compliant, non_compliant_users=non_compliant, total_users=total,
+            cum_compliant=cum_compliant, cum_non_compliant=cum_non_compliant,
+        ))
+    with transaction.atomic():
+        ComplianceRollup.objects.filter(Q(date__lt=first) | Q(date__gt=last)).delete()
+        ComplianceRollup.objects.bulk_create(
+            rows, update_conflicts=True, unique_fields=_conflict_target(["date"]), update_fields=ROLLUP_FIELDS,
+            batch_size=1000,
+        )
+    return len(rows)
+
+
+def rolling_compliance(base_date, windows=CHART_WINDOWS):
+    """
+    {days: {"compliant", "non_compliant", "total_users"}} for the windows
+    ending on base_date: daily averages from two prefix-sum rows per window,
+    and the window's largest headcount. Two queries for all windows (three
+    when base_date is past the last rolled-up day).
+    """
+    before = {days: base_date - timedelta(days=days) for days in windows}
+    rows = {r.date: r for r in ComplianceRollup.objects.filter(date__in={base_date, *before.values()})}
+    last = None
+    if base_date not in rows:
+        last = ComplianceRollup.objects.filter(date__lte=base_date).order_by("-date").first()
+
+    def running(day):
+        # rows are gap-free, so a missing day is either before the first row or after the last one
+        row = rows.get(day) or (last if last and day >= last.date else None)
+        return (row.cum_compliant, row.cum_non_compliant) if row else (0, 0)
+
+    largest = ComplianceRollup.objects.filter(
+        date__gt=min(before.values()), date__lte=base_date
+    ).aggregate(**{
+        f"days_{days}": Max("total_users", filter=Q(date__gt=before[days])) for days in windows
+    })
+
+    end_compliant, end_non_compliant = running(base_date)
+    result = {}
+    for days in windows:
+        start_compliant, start_non_compliant = running(before[days])
+        result[days] = {
+            "compliant": (end_compliant - start_compliant) // days,
+            "non_compliant": (end_non_compliant - start_non_compliant) // days,
+            "total_users": largest[f"days_{days}"] or 0,
+        }
+    return result
+
+
+def refresh_day(day):
+    """Fetch and store a single day (on-demand refresh); raises ComplianceAPIError if nothing was stored."""
+    if not sync_compliance(day, day, fetcher=ComplianceFetcher(retries=2)):
+        raise ComplianceAPIError(f"{day}: no data stored")
+
+
+def run_compliance_sync(start=None, end=None, fetcher=None, batch_days=UPSERT_BATCH_DAYS, stream=False):
+    """
+    Incremental sync. Defaults to the day after the high-water mark (or
+    SYNC_START) through yesterday, the last complete day. `stream` stores
+    days one at a time through stream_compliance. Returns
+    {"start", "end", "days", "high_water_mark"}.
+    """
+    checkpoint, _ = SyncCheckpoint.objects.get_or_create(source=SYNC_SOURCE)
+    mark = checkpoint.high_water_mark
+    end = as_date(end) if end else date.today() - timedelta(days=1)
+    if start:
+        start = as_date(start)
+    else:
+        start = mark + timedelta(days=1) if mark else SYNC_START
+    if start > end:
+        return {"start": start, "end": end, "days": 0, "high_water_mark": mark}
+
+    days = date_range(start, end)
+    # the mark only moves if this run continues from it without a gap
+    extends_mark = mark is None or start <= mark + timedelta(days=1)
+    done = set()
+    contiguous = 0
+
+    def advance(stored_days):
+        nonlocal contiguous
+        done.update(stored_days)
+        while contiguous < len(days) and days[contiguous] in done:
+            contiguous += 1
+        if extends_mark and contiguous:
+            reached = days[contiguous - 1]
+            if checkpoint.high_water_mark is None or reached > checkpoint.high_water_mark:
+                checkpoint.high_water_mark = reached
+                checkpoint.save(update_fields=["high_water_mark", "updated_at"])
+
+    def store(batch):
+        stored = store_compliance_days(batch)
+        advance(p["date"] for p in batch)
+        return stored
+
+    if stream:
+        stored = stream_compliance(start, end, fetcher=fetcher, on_day=lambda day: advance([day]))
+    else:
+        stored = sync_compliance(start, end, fetcher=fetcher, store=store, batch_days=batch_days)
+    return {"start": start, "end": end, "days": stored, "high_water_mark": checkpoint.high_water_mark}
+
+
+def dump_compliance(out, start=None, end=None, chunk_size=UPSERT_BATCH_DAYS):
+    """
+    Write ComplianceRecord days (with their users, i.e. the per-user facts)
+    to the text stream `out` as NDJSON, oldest first. Streamed days, which
+    keep no users JSON, take their users from NonCompliantDay. Returns days
+    written.
+    """
+    records = ComplianceRecord.objects.order_by("date")
+    if start:
+        records = records.filter(date__gte=as_date(start))
+    if end:
+        records = records.filter(date__lte=as_date(end))
+    written = 0
+    for record in records.iterator(chunk_size=chunk_size):
+        payload = {"date": record.date.isoformat(), **{f: getattr(record, f) for f in RECORD_FIELDS}}
+        if not record.users and record.non_compliant_users:
+            payload["users"] = [
+                {"id": user_id, "email": email}
+                for user_id, email in NonCompliantDay.objects.filter(date=record.date).order_by("user_id").values_list(
+                    "user_id", "user__email"
+                )
+            ]
+        out.write(json.dumps(payload, separators=(",", ":")) + "\n")
+        written += 1
+    return written
+
+
+def load_compliance(lines, batch_days=UPSERT_BATCH_DAYS):
+    """
+    Store NDJSON day payloads (as written by dump_compliance) through
+    store_compliance_days, batch_days at a time; only one batch is held in
+    memory. Returns days stored.
+    """
+    stored, batch = 0, []
+    for line in lines:
+        if not line.strip():
+            continue
+        payload = json.loads(line)
+        payload["date"] = as_date(payload["date"])
+        for field in RECORD_FIELDS:
+            payload.setdefault(field, [] if field == "users" else {} if field == "pagination" else 0)
+        batch.append(payload)
+        if len(batch) >= batch_days:
+            stored += store_compliance_days(batch)
+            batch = []
+    if batch:
+        stored += store_compliance_days(batch)
+    return stored
@@ -0,0 +1,170 @@
+#hierarchy.py
+"""
+Org hierarchy closure table.
+
+OrgClosure holds one row per (ancestor, descendant) pair in the
+CustomUser.manager chain, including a depth-0 row for every user, so that
+"all transitive reports of X" and "all approvers of Y" are single indexed
+queries. Rows are kept in step with CustomUser.manager through model
+signals; rebuild_org_closure() recomputes the table after bulk imports
+(bulk_create / queryset.update bypass signals).
+
+It also caches each employee's approver set (direct manager plus the
+leads of their projects) for the review views; see approver_ids().
+"""
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .models import CustomUser, OrgClosure, Project, ProjectMember
+
+# Signals invalidate approver sets; the TTL only bounds staleness after bulk writes.
+APPROVERS_TTL = 600
+
+
+def all_reports(user, max_depth=None):
+    """Everyone below `user` in the manager chain (direct and skip-level)."""
+    # one filter() call so both conditions apply to the same closure row
+    conditions = {"closure_ancestors__ancestor": user, "closure_ancestors__depth__gt": 0}
+    if max_depth is not None:
+        conditions["closure_ancestors__depth__lte"] = max_depth
+    return CustomUser.objects.filter(**conditions)
+
+
+def skip_level_reports(user):
+    """Reports of `user`'s reports, and so on (depth >= 2)."""
+    return CustomUser.objects.filter(closure_ancestors__ancestor=user, closure_ancestors__depth__gt=1)
+
+
+def all_managers(user):
+    """`user`'s manager, their manager, ... nearest first."""
+    return CustomUser.objects.filter(
+        closure_descendants__descendant=user, closure_descendants__depth__gt=0
+    ).order_by("closure_descendants__depth")
+
+
+def _attach(user_id, manager_id):
+    """Link the subtree rooted at user_id under manager_id (its outside links must already be gone)."""
+    subtree = list(OrgClosure.objects.filter(ancestor_id=user_id).values_list("descendant_id", "depth"))
+    if manager_id is None:
+        return
+    above = list(OrgClosure.objects.filter(descendant_id=manager_id).values_list("ancestor_id", "depth"))
+    OrgClosure.objects.bulk_create([
+        OrgClosure(ancestor_id=a, descendant_id=d, depth=a_depth + 1 + d_depth)
+        for a, a_depth in above
+        for d, d_depth in subtree
+    ])
+
+
+def _detach(user_id):
+    """Remove every link from outside the subtree rooted at user_id into it."""
+    subtree = OrgClosure.objects.filter(ancestor_id=user_id).values_list("descendant_id", flat=True)
+    OrgClosure.objects.filter(descendant_id__in=list(subtree)).exclude(
+        ancestor_id__in=list(subtree)
+    ).delete()
+
+
+@receiver(pre_save, sender=CustomUser)
+def _remember_manager(sender, instance, raw=False, update_fields=None, **kwargs):
+    instance._previous_manager_id = instance.manager_id
+    if raw or instance.pk is None:
+        return
+    if update_fields is not None and "manager" not in update_fields:
+        return  # e.g. last_login on every sign-in
+    previous = CustomUser.objects.filter(pk=instance.pk).values_list("manager_id", flat=True).first()
+    instance._previous_manager_id = previous
+    # forms and the admin report cycles through CustomUser.clean(); this only stops code that skips validation
+    if instance.manager_id is not None and instance.manager_id != previous:
+        if OrgClosure.objects.filter(ancestor_id=instance.pk, descendant_id=instance.manager_id).exists():
+            raise IntegrityError(f"Manager cycle: user {instance.pk} cannot report to {instance.manager_id}")
+
+
+@receiver(post_save, sender=CustomUser)
+def _update_closure(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if instance.manager_id != instance._previous_manager_id:
+        invalidate_approvers([instance.pk])
+    with transaction.atomic():
+        if created:
+            OrgClosure.objects.get_or_create(ancestor_id=instance.pk, descendant_id=instance.pk, defaults={"depth": 0})
+            _attach(instance.pk, instance.manager_id)
+        elif instance.manager_id != instance._previous_manager_id:
+            OrgClosure.objects.get_or_create(ancestor_id=instance.pk, descendant_id=instance.pk, defaults={"depth": 0})
+            _detach(instance.pk)
+            _attach(instance.pk, instance.manager_id)
+
+
+@receiver(pre_delete, sender=CustomUser)
+def _orphan_reports(sender, instance, **kwargs):
+    # manager is SET_NULL via a queryset update (no save signals), so detach the subtrees here
+    for report_id in CustomUser.objects.filter(manager=instance).values_list("id", flat=True):
+        _detach(report_id)
+
+
+def rebuild_org_closure():
+    """Recompute OrgClosure from CustomUser.manager. Returns rows written."""
+    managers = dict(CustomUser.objects.values_list("id", "manager_id"))
+    rows = []
+    for user_id in managers:
+        depth, current, seen = 0, user_id, set()
+        while current is not None and current not in seen:
+            seen.add(current)
+            rows.append(OrgClosure(ancestor_id=current, descendant_id=user_id, depth=depth))
+            current = managers.get(current)
+            depth += 1
+    with transaction.atomic():
+        OrgClosure.objects.all().delete()
+        OrgClosure.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
+
+
+# ---------------- Approver sets ---------------- #
+
+def _approvers_key(user_id):
+    return f"myapp:approvers:{user_id}"
+
+
+def approver_ids(user_id):
+    """
+    frozenset of user ids allowed to review `user_id`'s leave: their direct
+    manager and the leads of every project they belong to. One cache hit,
+    or one query on a miss.
+    """
+    key = _approvers_key(user_id)
+    ids = cache.get(key)
+    if ids is None:
+        rows = CustomUser.objects.filter(id=user_id).values_list("manager_id").union(
+            Project.objects.filter(memberships__user_id=user_id).values_list("lead_id")
+        )
+        ids = frozenset(i for (i,) in rows if i is not None)
+        cache.set(key, ids, APPROVERS_TTL)
+    return ids
+
+
+def can_review(reviewer, user_id):
+    return reviewer.id in approver_ids(user_id)
+
+
+def invalidate_approvers(user_ids):
+    cache.delete_many([_approvers_key(i) for i in user_ids])
+
+
+@receiver([post_save, post_delete], sender=ProjectMember)
+def _membership_changed(sender, instance, **kwargs):
+    invalidate_approvers([instance.user_id])
+
+
+@receiver(pre_save, sender=Project)
+def _remember_lead(sender, instance, raw=False, **kwargs):
+    instance._previous_lead_id = None
+    if not raw and instance.pk is not None:
+        instance._previous_lead_id = Project.objects.filter(pk=instance.pk).values_list("lead_id", flat=True).first()
+
+
+@receiver(post_save, sender=Project)
+def _lead_changed(sender, instance, created, raw=False, **kwargs):
+    if raw or created or instance.lead_id == getattr(instance, "_previous_lead_id", instance.lead_id):
+        return
+    invalidate_approvers(instance.memberships.values_list("user_id", flat=True))
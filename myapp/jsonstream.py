@@ -0,0 +1,132 @@
+#jsonstream.py
+"""
+Incremental decoding of one large array inside a JSON object.
+
+    stream = JSONArrayStream(response.iter_content(65536), "users")
+    for user in stream:          # one element at a time
+        ...
+    stream.envelope              # the rest of the object, e.g. {"total_users": .., "users": [], ..}
+
+Only the current element and the bytes around the array are held in
+memory, so a page of any size decodes in constant space. Elements are
+decoded with json.JSONDecoder.raw_decode as soon as enough input has
+arrived.
+"""
+import codecs
+import json
+
+COMPACT_AT = 1 << 16  # drop consumed input once this much has piled up
+
+
+class JSONArrayStream:
+    def __init__(self, chunks, key):
+        self._chunks = iter(chunks)
+        self._key = key
+        self._decoder = json.JSONDecoder()
+        self._utf8 = codecs.getincrementaldecoder("utf-8")()
+        self._buf = ""
+        self._pos = 0
+        self._eof = False
+        self._prefix = None
+        self.envelope = None
+
+    def _more(self):
+        """Append the next chunk to the buffer; False once the input is exhausted."""
+        if self._eof:
+            return False
+        chunk = next(self._chunks, None)
+        if chunk is None:
+            self._eof = True
+            self._buf += self._utf8.decode(b"", final=True)
+            return False
+        if isinstance(chunk, bytes):
+            chunk = self._utf8.decode(chunk)
+        if self._pos >= COMPACT_AT:
+            self._buf = self._buf[self._pos:]
+            self._pos = 0
+        self._buf += chunk
+        return True
+
+    def _char(self):
+        """Next non-whitespace character (not consumed), or None at end of input."""
+        while True:
+            while self._pos < len(self._buf) and self._buf[self._pos] in " \t\r\n":
+                self._pos += 1
+            if self._pos < len(self._buf):
+                return self._buf[self._pos]
+            if not self._more():
+                return None
+
+    def _find_array(self):
+        """Scan the object up to the '[' of the top-level `key`; keeps that text as the envelope prefix."""
+        depth, in_string, escaped = 0, False, False
+        string_start, last_string, after_colon = None, None, False
+        i = 0
+        while True:
+            if i >= len(self._buf):
+                if not self._more():
+                    return False
+                continue
+            c = self._buf[i]
+            if in_string:
+                if escaped:
+                    escaped = False
+                elif c == "\\":
+                    escaped = True
+                elif c == '"':
+                    in_string = False
+                    if depth == 1 and not after_colon:
+                        last_string = json.loads(self._buf[string_start:i + 1])
+            elif c == '"':
+                in_string, string_start = True, i
+            elif c in "{[":
+                if c == "[" and depth == 1 and after_colon and last_string == self._key:
+                    self._prefix = self._buf[:i]
+                    self._pos = i + 1
+                    return True
+                depth += 1
+                after_colon = False
+            elif c in "}]":
+                depth -= 1
+            elif c == ":" and depth == 1:
+                after_colon = True
+            elif c == "," and depth == 1:
+                after_colon, last_string = False, None
+            i += 1
+
+    def __iter__(self):
+        if not self._find_array():
+            # no such array (e.g. an error body): the whole document is the envelope
+            self.envelope = json.loads(self._buf) if self._buf.strip() else {}
+            return
+        while True:
+            c = self._char()
+            if c is None:
+                raise ValueError(f"Unterminated '{self._key}' array")
+            if c == "]":
+                self._pos += 1
+                break
+            if c == ",":
+                self._pos += 1
+                continue
+            while True:
+                try:
+                    item, end = self._decoder.raw_decode(self._buf, self._pos)
+                except json.JSONDecodeError:
+                    if not self._more():
+                        raise
+                    continue
+                # a number cut by a chunk boundary ("1." of "1.5e3") decodes early:
+                # only accept the item once the delimiter after it has arrived
+                rest = self._buf[end:].lstrip(" \t\r\n")
+                if (not rest or rest[0] not in ",]") and self._more():
+                    continue
+                break
+            self._pos = end
+            if self._char() not in (",", "]"):
+                raise ValueError(f"Expected ',' or ']' in the '{self._key}' array at offset {self._pos}")
+            yield item
+
+        while self._more():
+            pass
+        self.envelope = json.loads(self._prefix + "[]" + self._buf[self._pos:])
@@ -0,0 +1,371 @@
+#ledger.py
+"""
+Leave balance ledger.
+
+LeaveBalance rows (and the ProjectAbsence headcount) are only written when
+a leave changes state (submitted, approved, rejected, cancelled, dates
+edited). Pending leave reserves its days in LeaveBalance.pending until it
+is reviewed. Read paths use get_leave_balance / get_leave_balances, which
+never write.
+
+The working days a leave holds are counted once, when it is submitted or
+its dates change, and kept on LeaveRequest.days; every later post or
+reversal uses that number, so adding or removing a holiday afterwards
+cannot make the ledger drift.
+
+Edits made outside the review flow (the admin) go through save_leave(),
+and deleting a leave releases the days it held (_release_deleted_leave).
+"""
+from collections import defaultdict
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from .availability import find_overlapping_leave, post_absence, post_absences
+from .models import CustomUser, LeaveBalance, LeaveRequest
+from .work_calendar import CALENDAR_END, CALENDAR_START, working_days, working_days_many
+
+
+def leave_days(start_date, end_date):
+    """
+    Number of days a leave from start_date to end_date counts against the
+    balance. Raises ValidationError for dates the working-day calendar
+    does not cover.
+    """
+    if not (CALENDAR_START <= start_date <= CALENDAR_END and CALENDAR_START <= end_date <= CALENDAR_END):
+        raise ValidationError(f"Leave dates must be between {CALENDAR_START} and {CALENDAR_END}.")
+    return working_days(start_date, end_date)
+
+
+def _default_balance(leave_type):
+    return {
+        "total": leave_type.yearly_limit,
+        "used": 0,
+        "pending": 0,
+        "remaining": leave_type.yearly_limit,
+    }
+
+
+def _as_dict(balance_obj):
+    return {
+        "total": balance_obj.total,
+        "used": balance_obj.used,
+        "pending": balance_obj.pending,
+        "remaining": balance_obj.remaining,
+    }
+
+
+def get_leave_balance(user, leave_type):
+    """
+    Read-only balance for one leave type. Returns the yearly limit
+    when no ledger row exists yet.
+    """
+    balance_obj = LeaveBalance.objects.filter(user=user, leave_type=leave_type).first()
+    if balance_obj is None:
+        return _default_balance(leave_type)
+    return _as_dict(balance_obj)
+
+
+def get_leave_balances(user, leave_types):
+    """
+    Read-only balances for a user, keyed by leave type name, in one query.
+    """
+    rows = {
+        b.leave_type_id: b
+        for b in LeaveBalance.objects.filter(user=user, leave_type__in=leave_types)
+    }
+    return {
+        lt.name: _as_dict(rows[lt.id]) if lt.id in rows else _default_balance(lt)
+        for lt in leave_types
+    }
+
+
+def get_balance_matrix(users, leave_types):
+    """
+    Read-only balances for a whole set of users in one query.
+    Returns {user_id: {leave type name: {"total", "used", "pending", "remaining"}}}
+    with a row for every user and every leave type.
+    """
+    user_ids = [u.id for u in users]
+    rows = {}
+    for b in LeaveBalance.objects.filter(user_id__in=user_ids, leave_type__in=leave_types).values(
+        "user_id", "leave_type_id", "total", "used", "pending", "remaining"
+    ):
+        rows[(b["user_id"], b["leave_type_id"])] = {
+            "total": b["total"],
+            "used": b["used"],
+            "pending": b["pending"],
+            "remaining": b["remaining"],
+        }
+    return {
+        uid: {
+            lt.name: rows.get((uid, lt.id)) or _default_balance(lt)
+            for lt in leave_types
+        }
+        for uid in user_ids
+    }
+
+
+def build_balance_report(users, leave_types):
+    """
+    [{"employee": user, "balances": {...}}, ...] for templates, from one
+    get_balance_matrix call.
+    """
+    users = list(users)
+    matrix = get_balance_matrix(users, leave_types)
+    return [{"employee": u, "balances": matrix[u.id]} for u in users]
+
+
+def _lock_balance(user_id, leave_type):
+    """Row-locked LeaveBalance for (user, leave_type), created if missing. Caller holds a transaction."""
+    balance_obj, _ = LeaveBalance.objects.select_for_update().get_or_create(
+        user_id=user_id,
+        leave_type=leave_type,
+        defaults={"total": leave_type.yearly_limit, "used": 0, "pending": 0, "remaining": leave_type.yearly_limit}
+    )
+    return balance_obj
+
+
+def held_days(leave):
+    """Working days `leave` holds in the ledger: the stored count, or a fresh one for rows never counted."""
+    return leave.days if leave.days is not None else leave_days(leave.start_date, leave.end_date)
+
+
+def _contribution(status, days):
+    """(used, pending) days a leave in `status` holding `days` counts against the balance."""
+    if status == "Approved":
+        return days, 0
+    if status == "Pending":
+        return 0, days
+    return 0, 0
+
+
+def _post_days(user_id, leave_type, used=0, pending=0):
+    """Add used/pending deltas to the (user, leave_type) balance. Caller holds a transaction."""
+    balance_obj = _lock_balance(user_id, leave_type)
+    balance_obj.used = max(balance_obj.used + used, 0)
+    balance_obj.pending = max(balance_obj.pending + pending, 0)
+    balance_obj.remaining = max(balance_obj.total - balance_obj.used, 0)
+    balance_obj.save(update_fields=["used", "pending", "remaining"])
+
+
+# fields _repost reads from the row as it was before a change
+PREVIOUS_FIELDS = ("status", "start_date", "end_date", "days", "user", "leave_type")
+
+
+def _repost(leave, previous):
+    """
+    Move the ledger from `previous` (the row before the change) to `leave`
+    (days already set), including a move to another user or leave type.
+    """
+    old_used, old_pending = _contribution(previous.status, held_days(previous))
+    new_used, new_pending = _contribution(leave.status, leave.days)
+    if (previous.user_id, previous.leave_type_id) == (leave.user_id, leave.leave_type_id):
+        if (old_used, old_pending) != (new_used, new_pending):
+            _post_days(leave.user_id, leave.leave_type, new_used - old_used, new_pending - old_pending)
+    else:
+        if old_used or old_pending:
+            _post_days(previous.user_id, previous.leave_type, -old_used, -old_pending)
+        if new_used or new_pending:
+            _post_days(leave.user_id, leave.leave_type, new_used, new_pending)
+
+    if previous.status == "Approved":
+        post_absence(previous.user_id, previous.start_date, previous.end_date, -1)
+    if leave.status == "Approved":
+        post_absence(leave.user_id, leave.start_date, leave.end_date, 1)
+
+
+def submit_leave(user, leave_type, start_date, end_date, reason):
+    """
+    Create a Pending leave and reserve its days in one transaction.
+
+    The user row is locked first, so concurrent submissions of any leave
+    type cannot both pass the overlap check, then the (user, leave_type)
+    balance row for the balance check (double clicks included). Raises
+    ValidationError with a user-facing message.
+    """
+    requested_days = leave_days(start_date, end_date)
+    if requested_days <= 0:
+        raise ValidationError("The selected dates contain no working days.")
+
+    with transaction.atomic():
+        # always user row before balance row, the same order for every submission
+        CustomUser.objects.select_for_update().only("pk").get(pk=user.pk)
+        balance_obj = _lock_balance(user.id, leave_type)
+
+        overlapping = find_overlapping_leave(user, start_date, end_date)
+        if overlapping:
+            raise ValidationError(f"These dates overlap your {overlapping.status.lower()} leave "
+                                  f"from {overlapping.start_date} to {overlapping.end_date}.")
+
+        available = balance_obj.remaining - balance_obj.pending
+        if available <= 0:
+            raise ValidationError(f"You have no remaining {leave_type.name} leave.")
+        elif requested_days > available:
+            raise ValidationError(f"You only have {available} days left for {leave_type.name} leave.")
+
+        leave = LeaveRequest.objects.create(
+            user=user,
+            leave_type=leave_type,
+            start_date=start_date,
+            end_date=end_date,
+            reason=reason,
+            status='Pending',
+            days=requested_days,
+        )
+        balance_obj.pending += requested_days
+        balance_obj.save(update_fields=["pending"])
+    return leave
+
+
+def set_leave_status(leave, status, reviewed_by=None, review_reason=None):
+    """
+    Move a leave to a new status (Approved / Rejected / Cancelled ...) and
+    post the change in used/pending days to the ledger in the same transaction.
+    """
+    with transaction.atomic():
+        previous = LeaveRequest.objects.select_for_update().only(*PREVIOUS_FIELDS).get(pk=leave.pk)
+
+        leave.status = status
+        leave.days = held_days(previous)
+        update_fields = ["status", "days"]
+        if reviewed_by is not None:
+            leave.reviewed_by = reviewed_by
+            update_fields.append("reviewed_by")
+        if review_reason is not None:
+            leave.review_reason = review_reason
+            update_fields.append("review_reason")
+        leave.save(update_fields=update_fields)
+
+        _repost(leave, previous)
+    return leave
+
+
+def bulk_set_leave_status(leaves, leave_ids, status, reviewed_by, review_reason=""):
+    """
+    Review many Pending leaves at once. `leaves` is the queryset the
+    reviewer is allowed to act on; it is resolved to ids in one query.
+
+    Everything runs in one transaction: one bulk_update for the leaves,
+    then one ledger post per affected (user, leave_type), in key order.
+    Returns {leave_id: "Approved" / "Rejected" / error message}.
+    """
+    leave_ids = list(dict.fromkeys(int(i) for i in leave_ids))
+    allowed = set(leaves.filter(id__in=leave_ids).values_list("id", flat=True).distinct())
+
+    with transaction.atomic():
+        locked = {
+            l.id: l for l in LeaveRequest.objects.select_for_update().select_related("leave_type").filter(
+                id__in=allowed, status="Pending"
+            ).order_by("id")
+        }
+        changed = list(locked.values())
+        for leave in changed:
+            leave.status = status
+            leave.reviewed_by = reviewed_by
+            leave.review_reason = review_reason
+
+        uncounted = [l for l in changed if l.days is None]
+        for leave, n in zip(uncounted, working_days_many([(l.start_date, l.end_date) for l in uncounted])):
+            leave.days = n
+        LeaveRequest.objects.bulk_update(changed, ["status", "reviewed_by", "review_reason", "days"])
+
+        deltas = defaultdict(lambda: [0, 0])
+        leave_types = {}
+        for leave in changed:
+            n = leave.days
+            key = (leave.user_id, leave.leave_type_id)
+            leave_types[key] = leave.leave_type
+            deltas[key][1] -= n
+            if status == "Approved":
+                deltas[key][0] += n
+        # balance rows are locked in (user, leave_type) order, so overlapping bulk reviews cannot deadlock
+        for key in sorted(deltas):
+            used, pending = deltas[key]
+            _post_days(key[0], leave_types[key], used, pending)
+
+        if status == "Approved":
+            post_absences([(l.user_id, l.start_date, l.end_date) for l in changed], 1)
+
+    results = {}
+    for leave_id in leave_ids:
+        if leave_id in locked:
+            results[leave_id] = status
+        elif leave_id in allowed:
+            results[leave_id] = "Not pending"
+        else:
+            results[leave_id] = "Not found or not authorized"
+    return results
+
+
+def update_leave_dates(leave, start_date, end_date):
+    """
+    Edit the dates of a leave. Pending and approved leaves adjust the
+    ledger by the difference in days.
+    """
+    with transaction.atomic():
+        previous = LeaveRequest.objects.select_for_update().only(*PREVIOUS_FIELDS).get(pk=leave.pk)
+
+        leave.start_date = start_date
+        leave.end_date = end_date
+        leave.days = leave_days(start_date, end_date)
+        leave.save(update_fields=["start_date", "end_date", "days"])
+
+        if previous.status in ("Pending", "Approved"):
+            _repost(leave, previous)
+    return leave
+
+
+def save_leave(leave):
+    """
+    Save a leave edited as a whole (the admin form: any of status, dates,
+    user, leave type) or created directly, and post the difference to the
+    ledger in the same transaction. Days are recounted only when the dates
+    change.
+    """
+    with transaction.atomic():
+        previous = None
+        if leave.pk is not None:
+            previous = LeaveRequest.objects.select_for_update().only(*PREVIOUS_FIELDS).filter(pk=leave.pk).first()
+        if previous is not None and (previous.start_date, previous.end_date) == (leave.start_date, leave.end_date):
+            leave.days = held_days(previous)
+        else:
+            leave.days = leave_days(leave.start_date, leave.end_date)
+        leave.save()
+
+        if previous is None:
+            # a new row held nothing before
+            previous = LeaveRequest(status="Rejected", user_id=leave.user_id, leave_type_id=leave.leave_type_id,
+                                    start_date=leave.start_date, end_date=leave.end_date, days=0)
+        _repost(leave, previous)
+    return leave
+
+
+@receiver(post_delete, sender=LeaveRequest)
+def _release_deleted_leave(sender, instance, **kwargs):
+    """Give back the days a deleted leave held (deletes run in a transaction)."""
+    used, pending = _contribution(instance.status, held_days(instance))
+    if used or pending:
+        # no get_or_create: when the user or leave type itself is being deleted the balance may be gone already
+        balance_obj = LeaveBalance.objects.select_for_update().filter(
+            user_id=instance.user_id, leave_type_id=instance.leave_type_id
+        ).first()
+        if balance_obj is not None:
+            balance_obj.used = max(balance_obj.used - used, 0)
+            balance_obj.pending = max(balance_obj.pending - pending, 0)
+            balance_obj.remaining = max(balance_obj.total - balance_obj.used, 0)
+            balance_obj.save(update_fields=["used", "pending", "remaining"])
+    if instance.status == "Approved":
+        post_absence(instance.user_id, instance.start_date, instance.end_date, -1)
+
+
+def sync_leave_type_limit(leave_type):
+    """Propagate a changed yearly limit to every existing balance of that type."""
+    with transaction.atomic():
+        balances = list(LeaveBalance.objects.select_for_update().filter(leave_type=leave_type))
+        for b in balances:
+            b.total = leave_type.yearly_limit
+            b.remaining = max(b.total - b.used, 0)
+        LeaveBalance.objects.bulk_update(balances, ["total", "remaining"])
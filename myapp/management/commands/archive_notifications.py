@@ -0,0 +1,23 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from myapp.notifications import ARCHIVE_BATCH_SIZE, archive_read_notifications, rebuild_notification_counters
+
+
+class Command(BaseCommand):
+    help = "Move read notifications older than N days into the archive table"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=90, help="Archive read notifications older than this")
+        parser.add_argument("--batch-size", type=int, default=ARCHIVE_BATCH_SIZE)
+        parser.add_argument("--recount", action="store_true", help="Also rebuild the per-user unread counters")
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options["days"])
+        moved = archive_read_notifications(cutoff, batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Archived {moved} read notification(s) older than {options['days']} days."))
+        if options["recount"]:
+            rebuild_notification_counters()
+            self.stdout.write(self.style.SUCCESS("Rebuilt unread counters."))
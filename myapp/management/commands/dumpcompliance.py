@@ -0,0 +1,25 @@
+import gzip
+import sys
+
+from django.core.management.base import BaseCommand
+from myapp.compliance import dump_compliance
+
+
+class Command(BaseCommand):
+    help = "Dump compliance days (records and their users) as NDJSON; gzip-compressed when the file ends in .gz"
+
+    def add_arguments(self, parser):
+        parser.add_argument("output", help="Output file (e.g. compliance.ndjson.gz), or - for stdout")
+        parser.add_argument("--start", help="First day to dump (YYYY-MM-DD)")
+        parser.add_argument("--end", help="Last day to dump (YYYY-MM-DD)")
+
+    def handle(self, *args, **options):
+        path = options["output"]
+        if path == "-":
+            written = dump_compliance(sys.stdout, options["start"], options["end"])
+            self.stderr.write(f"Dumped {written} day(s).")
+            return
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, "wt", encoding="utf-8") as out:
+            written = dump_compliance(out, options["start"], options["end"])
+        self.stdout.write(self.style.SUCCESS(f"Dumped {written} day(s) to {path}."))
@@ -0,0 +1,23 @@
+import gzip
+import sys
+
+from django.core.management.base import BaseCommand
+from myapp.compliance import UPSERT_BATCH_DAYS, load_compliance
+
+
+class Command(BaseCommand):
+    help = "Load a dumpcompliance NDJSON file (.gz or plain) into ComplianceRecord, UserData and the fact tables"
+
+    def add_arguments(self, parser):
+        parser.add_argument("input", help="File written by dumpcompliance, or - for stdin")
+        parser.add_argument("--batch-days", type=int, default=UPSERT_BATCH_DAYS, help="Days per write batch")
+
+    def handle(self, *args, **options):
+        path = options["input"]
+        if path == "-":
+            stored = load_compliance(sys.stdin, options["batch_days"])
+        else:
+            opener = gzip.open if path.endswith(".gz") else open
+            with opener(path, "rt", encoding="utf-8") as lines:
+                stored = load_compliance(lines, options["batch_days"])
+        self.stdout.write(self.style.SUCCESS(f"Loaded {stored} day(s)."))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from myapp.models import CustomUser, LeaveType
+from myapp.utils import calculate_leave_balance
+
+
+class Command(BaseCommand):
+    help = "Rebuild every LeaveBalance row from approved leaves (one-off backfill / repair of the ledger)"
+
+    def handle(self, *args, **options):
+        leave_types = list(LeaveType.objects.all())
+        rebuilt = 0
+
+        for user in CustomUser.objects.filter(is_superuser=False).iterator():
+            for lt in leave_types:
+                calculate_leave_balance(user, lt)
+                rebuilt += 1
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {rebuilt} leave balances."))
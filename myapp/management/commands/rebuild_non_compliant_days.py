@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from myapp.compliance import rebuild_non_compliant_days
+
+
+class Command(BaseCommand):
+    help = "Rebuild the NonCompliantDay table from the users stored on ComplianceRecord"
+
+    def handle(self, *args, **options):
+        rows = rebuild_non_compliant_days()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt non-compliant days ({rows} rows)."))
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from myapp.hierarchy import rebuild_org_closure
+
+
+class Command(BaseCommand):
+    help = "Rebuild the org hierarchy closure table from CustomUser.manager (run after bulk user imports)"
+
+    def handle(self, *args, **options):
+        rows = rebuild_org_closure()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt org closure table ({rows} rows)."))
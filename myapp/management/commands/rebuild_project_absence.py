@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from myapp.availability import rebuild_project_absence
+
+
+class Command(BaseCommand):
+    help = "Rebuild the per-project daily absence headcount from approved leaves (run after membership changes)"
+
+    def handle(self, *args, **options):
+        rows = rebuild_project_absence()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt project absence table ({rows} project-days)."))
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from myapp.compliance import rebuild_user_dates
+
+
+class Command(BaseCommand):
+    help = "Recompute UserData.dates from the NonCompliantDay table in bulk"
+
+    def handle(self, *args, **options):
+        written = rebuild_user_dates()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt dates for {written} user(s)."))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from myapp.compliance import as_date
+from myapp.reconciliation import reconcile_compliance
+
+
+class Command(BaseCommand):
+    help = "Rebuild the non-compliance vs approved leave discrepancy table (ComplianceDiscrepancy)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--since", help="Only rebuild runs from this day on (YYYY-MM-DD); default: everything")
+
+    def handle(self, *args, **options):
+        since = as_date(options["since"]) if options["since"] else None
+        rows = reconcile_compliance(since)
+        self.stdout.write(self.style.SUCCESS(f"Reconciled non-compliance with approved leave ({rows} runs)."))
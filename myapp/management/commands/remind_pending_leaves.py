@@ -0,0 +1,19 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from myapp.models import LeaveRequest
+from myapp.notifications import notify_pending_reviewers
+
+
+class Command(BaseCommand):
+    help = "Remind approvers about leave requests that have been pending for a while"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=2, help="Remind about requests pending at least this many days")
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options["days"])
+        sent = notify_pending_reviewers(LeaveRequest.objects.filter(status="Pending", applied_at__lte=cutoff))
+        self.stdout.write(self.style.SUCCESS(f"Sent {len(sent)} reminder(s)."))
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from myapp.compliance import CONCURRENCY, ComplianceFetcher, run_compliance_sync
+
+
+class Command(BaseCommand):
+    help = ("Sync non-compliance data (ComplianceRecord and UserData) from the API, "
+            "starting after the last synced day")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--start", help="First day to fetch (YYYY-MM-DD); defaults to the day after the checkpoint")
+        parser.add_argument("--end", help="Last day to fetch (YYYY-MM-DD); defaults to yesterday")
+        parser.add_argument("--concurrency", type=int, default=CONCURRENCY, help="Requests in flight at once")
+        parser.add_argument("--stream", action="store_true",
+                            help="Decode pages incrementally and store one day at a time (flat memory for large days)")
+
+    def handle(self, *args, **options):
+        result = run_compliance_sync(
+            start=options["start"],
+            end=options["end"],
+            fetcher=ComplianceFetcher(concurrency=options["concurrency"]),
+            stream=options["stream"],
+        )
+        if not result["days"]:
+            self.stdout.write(self.style.SUCCESS(f"Nothing to sync (synced up to {result['high_water_mark']})."))
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f"Synced {result['days']} day(s) from {result['start']} to {result['end']}; "
+            f"synced up to {result['high_water_mark']}."
+        ))
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:04
+
+from django.db import migrations, models
+
+
+def drop_duplicate_balances(apps, schema_editor):
+    # Keep the oldest row per (user, leave_type); rebuild_leave_balances recomputes it.
+    LeaveBalance = apps.get_model('myapp', 'LeaveBalance')
+    seen = set()
+    duplicates = []
+    for pk, user_id, leave_type_id in LeaveBalance.objects.order_by('id').values_list('id', 'user_id', 'leave_type_id'):
+        if (user_id, leave_type_id) in seen:
+            duplicates.append(pk)
+        else:
+            seen.add((user_id, leave_type_id))
+    LeaveBalance.objects.filter(id__in=duplicates).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0007_projectabsence'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='leavebalance',
+            name='pending',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(drop_duplicate_balances, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='leavebalance',
+            constraint=models.UniqueConstraint(fields=('user', 'leave_type'), name='leave_balance_unique'),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:10
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def build_closure(apps, schema_editor):
+    User = apps.get_model('myapp', 'CustomUser')
+    OrgClosure = apps.get_model('myapp', 'OrgClosure')
+    managers = dict(User.objects.values_list('id', 'manager_id'))
+    rows = []
+    for user_id in managers:
+        depth, current, seen = 0, user_id, set()
+        while current is not None and current not in seen:
+            seen.add(current)
+            rows.append(OrgClosure(ancestor_id=current, descendant_id=user_id, depth=depth))
+            current = managers.get(current)
+            depth += 1
+    OrgClosure.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0009_access_path_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrgClosure',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('depth', models.PositiveIntegerField()),
+                ('ancestor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='closure_descendants', to=settings.AUTH_USER_MODEL)),
+                ('descendant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='closure_ancestors', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['descendant', 'depth'], name='org_closure_descendant_idx'), models.Index(fields=['ancestor', 'depth'], name='org_closure_ancestor_idx')],
+                'constraints': [models.UniqueConstraint(fields=('ancestor', 'descendant'), name='org_closure_unique')],
+            },
+        ),
+        migrations.RunPython(build_closure, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def fill_non_compliant_days(apps, schema_editor):
+    # Same as myapp.compliance.rebuild_non_compliant_days, on the historical models
+    ComplianceRecord = apps.get_model('myapp', 'ComplianceRecord')
+    UserData = apps.get_model('myapp', 'UserData')
+    NonCompliantDay = apps.get_model('myapp', 'NonCompliantDay')
+    known = set(UserData.objects.values_list('user_id', flat=True))
+    rows = []
+    for record in ComplianceRecord.objects.only('date', 'users').iterator(chunk_size=30):
+        missing = []
+        for user in record.users or []:
+            user_id, email = user.get('id'), user.get('email')
+            if not user_id or not email:
+                continue
+            if user_id not in known:
+                known.add(user_id)
+                missing.append(UserData(user_id=user_id, email=email, dates=[]))
+            rows.append(NonCompliantDay(date=record.date, user_id=user_id))
+        UserData.objects.bulk_create(missing)
+        if len(rows) >= 5000:
+            NonCompliantDay.objects.bulk_create(rows, ignore_conflicts=True)
+            rows = []
+    NonCompliantDay.objects.bulk_create(rows, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0012_synccheckpoint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NonCompliantDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='non_compliant_days', to='myapp.userdata', to_field='user_id')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'date'], name='non_compliant_user_date_idx')],
+                'constraints': [models.UniqueConstraint(fields=('date', 'user'), name='non_compliant_day_unique')],
+            },
+        ),
+        migrations.RunPython(fill_non_compliant_days, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:22
+
+import datetime
+
+from django.db import migrations, models
+
+
+def fill_rollups(apps, schema_editor):
+    # Same as myapp.compliance.refresh_rollups(), on the historical models
+    ComplianceRecord = apps.get_model('myapp', 'ComplianceRecord')
+    ComplianceRollup = apps.get_model('myapp', 'ComplianceRollup')
+    counts = {
+        day: (compliant, non_compliant, total)
+        for day, compliant, non_compliant, total in ComplianceRecord.objects.values_list(
+            'date', 'compliant_users', 'non_compliant_users', 'total_users'
+        )
+    }
+    if not counts:
+        return
+    day, last = min(counts), max(counts)
+    cum_compliant = cum_non_compliant = 0
+    rows = []
+    while day <= last:
+        compliant, non_compliant, total = counts.get(day, (0, 0, 0))
+        cum_compliant += compliant
+        cum_non_compliant += non_compliant
+        rows.append(ComplianceRollup(
+            date=day, compliant_users=compliant, non_compliant_users=non_compliant, total_users=total,
+            cum_compliant=cum_compliant, cum_non_compliant=cum_non_compliant,
+        ))
+        day += datetime.timedelta(days=1)
+    ComplianceRollup.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0013_noncompliantday'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ComplianceRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True)),
+                ('compliant_users', models.PositiveIntegerField(default=0)),
+                ('non_compliant_users', models.PositiveIntegerField(default=0)),
+                ('total_users', models.PositiveIntegerField(default=0)),
+                ('cum_compliant', models.BigIntegerField(default=0)),
+                ('cum_non_compliant', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(fill_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,80 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:28
+
+import datetime
+from collections import defaultdict
+from itertools import groupby
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def fill_discrepancies(apps, schema_editor):
+    # Same as myapp.reconciliation.reconcile_compliance(), on the historical models
+    CustomUser = apps.get_model('myapp', 'CustomUser')
+    LeaveRequest = apps.get_model('myapp', 'LeaveRequest')
+    NonCompliantDay = apps.get_model('myapp', 'NonCompliantDay')
+    ComplianceDiscrepancy = apps.get_model('myapp', 'ComplianceDiscrepancy')
+    accounts = {username.lower(): pk for username, pk in CustomUser.objects.values_list('username', 'id')}
+    leave = defaultdict(list)
+    for username, start, end in LeaveRequest.objects.filter(status='Approved').order_by(
+        'user_id', 'start_date'
+    ).values_list('user__username', 'start_date', 'end_date'):
+        leave[username.lower()].append((start, end))
+
+    rows = []
+    facts = NonCompliantDay.objects.order_by('user_id', 'date').values_list('user_id', 'user__email', 'date')
+    for user_id, group in groupby(facts.iterator(chunk_size=5000), key=lambda row: row[0]):
+        group = list(group)
+        email = group[0][1].lower()
+        ranges = []
+        for start, end in sorted(leave.get(email, [])):
+            if ranges and start <= ranges[-1][1] + datetime.timedelta(days=1):
+                ranges[-1][1] = max(ranges[-1][1], end)
+            else:
+                ranges.append([start, end])
+        runs, i = [], 0
+        for _, _, day in group:
+            while i < len(ranges) and ranges[i][1] < day:
+                i += 1
+            kind = 'on_leave' if i < len(ranges) and ranges[i][0] <= day else 'unexcused'
+            if runs and runs[-1][0] == kind and runs[-1][2] + datetime.timedelta(days=1) == day:
+                runs[-1][2] = day
+                runs[-1][3] += 1
+            else:
+                runs.append([kind, day, day, 1])
+        rows.extend(
+            ComplianceDiscrepancy(user_id=user_id, employee_id=accounts.get(email), kind=kind,
+                                  start_date=start, end_date=end, days=count)
+            for kind, start, end, count in runs
+        )
+        if len(rows) >= 5000:
+            ComplianceDiscrepancy.objects.bulk_create(rows)
+            rows = []
+    ComplianceDiscrepancy.objects.bulk_create(rows)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0014_compliancerollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ComplianceDiscrepancy',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('on_leave', 'On approved leave'), ('unexcused', 'No approved leave')], max_length=20)),
+                ('start_date', models.DateField()),
+                ('end_date', models.DateField()),
+                ('days', models.PositiveIntegerField()),
+                ('employee', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='compliance_discrepancies', to=settings.AUTH_USER_MODEL)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='discrepancies', to='myapp.userdata', to_field='user_id')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'start_date'], name='discrepancy_user_start_idx'), models.Index(fields=['end_date'], name='discrepancy_end_idx'), models.Index(fields=['kind', 'start_date'], name='discrepancy_kind_start_idx')],
+            },
+        ),
+        migrations.RunPython(fill_discrepancies, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:38
+
+from django.db import migrations, models
+
+
+def count_leave_days(apps, schema_editor):
+    # Store today's working-day count on every leave that holds days in the ledger
+    from myapp.work_calendar import WorkingDayCalendar
+
+    Holiday = apps.get_model('myapp', 'Holiday')
+    LeaveRequest = apps.get_model('myapp', 'LeaveRequest')
+    calendar = WorkingDayCalendar(Holiday.objects.values_list('date', flat=True))
+    leaves = list(LeaveRequest.objects.filter(status__in=['Approved', 'Pending']).only('start_date', 'end_date'))
+    for leave in leaves:
+        leave.days = calendar.count(leave.start_date, leave.end_date)
+    LeaveRequest.objects.bulk_update(leaves, ['days'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0015_compliancediscrepancy'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='leaverequest',
+            name='days',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.RunPython(count_leave_days, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,5 @@
 from django.conf import settings
+from django.core.exceptions import ValidationError
 from django.db import models
 from django.contrib.auth.models import AbstractUser
 
@@ -20,10 +21,39 @@ class CustomUser(AbstractUser):
     # 🔹 New field for designation/skillset
     designation = models.CharField(max_length=100, blank=True, null=True)
 
+    def clean(self):
+        super().clean()
+        # OrgClosure has a depth-0 row per user, so this also rejects managing yourself
+        if self.pk and self.manager_id and OrgClosure.objects.filter(
+            ancestor_id=self.pk, descendant_id=self.manager_id
+        ).exists():
+            raise ValidationError({"manager": "A user cannot report to someone in their own reporting chain."})
+
     def __str__(self):
         return f"{self.username} ({self.role})"
 
 
+# 🔹 Closure table over CustomUser.manager (maintained by myapp.hierarchy)
+class OrgClosure(models.Model):
+    ancestor = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name="closure_descendants")
+    descendant = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name="closure_ancestors")
+    depth = models.PositiveIntegerField()  # 0 = self, 1 = direct report, 2 = skip-level, ...
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["ancestor", "descendant"], name="org_closure_unique"),
+        ]
+        indexes = [
+            # "all approvers of Y"
+            models.Index(fields=["descendant", "depth"], name="org_closure_descendant_idx"),
+            # "all transitive reports of X"
+            models.Index(fields=["ancestor", "depth"], name="org_closure_ancestor_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.ancestor_id} -> {self.descendant_id} ({self.depth})"
+
+
 class LeaveType(models.Model):
     name = models.CharField(max_length=100, unique=True)
     yearly_limit = models.IntegerField(default=0)
@@ -44,6 +74,9 @@ class LeaveRequest(models.Model):
         default="Pending"
     )
     applied_at = models.DateTimeField(auto_now_add=True)
+    # working days this leave holds in the ledger, counted when it was submitted or its dates changed;
+    # reversals use this number, so later holiday edits cannot skew LeaveBalance (null: not counted yet)
+    days = models.PositiveIntegerField(null=True, blank=True)
 
     leads_notified = models.BooleanField(default=False)
 
@@ -56,6 +89,20 @@ class LeaveRequest(models.Model):
         related_name="reviewed_leaves"
     )
 
+    class Meta:
+        indexes = [
+            # overlap checks: user=X AND start_date <= end AND end_date >= start
+            models.Index(fields=["user", "start_date", "end_date"], name="leave_user_range_idx"),
+            # "who is out on day D"
+            models.Index(fields=["start_date", "end_date"], name="leave_range_idx"),
+            # per-user status filters (balances, chatbot context, approvals)
+            models.Index(fields=["user", "status"], name="leave_user_status_idx"),
+            # HR / manager pending queues, keyset-paginated on (applied_at, id)
+            models.Index(fields=["status", "applied_at", "id"], name="leave_status_applied_idx"),
+            # "my requests" pages, keyset-paginated on (applied_at, id)
+            models.Index(fields=["user", "applied_at", "id"], name="leave_user_applied_idx"),
+        ]
+
     def __str__(self):
         return f"{self.user.username} - {self.leave_type.name} ({self.status})"
 
@@ -65,12 +112,31 @@ class LeaveBalance(models.Model):
     leave_type = models.ForeignKey("LeaveType", on_delete=models.CASCADE)
     total = models.IntegerField(default=0)
     used = models.IntegerField(default=0)
+    # days held by Pending requests (reserved at submission, released on review)
+    pending = models.IntegerField(default=0)
     remaining = models.IntegerField(default=0)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "leave_type"], name="leave_balance_unique"),
+        ]
+
     def __str__(self):
         return f"{self.user.username} - {self.leave_type.name}"
 
 
+# 🔹 Public holidays (not counted as working days)
+class Holiday(models.Model):
+    date = models.DateField(unique=True)
+    name = models.CharField(max_length=100)
+
+    class Meta:
+        ordering = ['date']
+
+    def __str__(self):
+        return f"{self.name} ({self.date})"
+
+
 # 🔹 New Project Model
 class Project(models.Model):
     STATUS_CHOICES = [
@@ -100,11 +166,34 @@ class ProjectMember(models.Model):
     role_in_project = models.CharField(max_length=100, blank=True, null=True)  # e.g. Backend Dev, Tester
     joined_at = models.DateField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # project__lead=X joins: project -> members without touching the table
+            models.Index(fields=["project", "user"], name="member_project_user_idx"),
+            # projects of a user
+            models.Index(fields=["user", "project"], name="member_user_project_idx"),
+        ]
+
     def __str__(self):
         return f"{self.user.username} in {self.project.name} as {self.role_in_project or 'Member'}"
 
 
 
+# 🔹 Daily absence headcount per project (maintained by myapp.availability)
+class ProjectAbsence(models.Model):
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name="absences")
+    date = models.DateField()
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["project", "date"], name="project_absence_unique"),
+        ]
+
+    def __str__(self):
+        return f"{self.project.name} {self.date}: {self.count} out"
+
+
 # models.py
 class Notification(models.Model):
     recipient = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name="notifications")
@@ -112,6 +201,36 @@ class Notification(models.Model):
     is_read = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # unread notifications of a user, newest first
+            models.Index(fields=["recipient", "is_read", "created_at"], name="notif_recipient_unread_idx"),
+        ]
+
+
+# 🔹 Denormalized unread count per user (maintained by myapp.notifications)
+class NotificationCounter(models.Model):
+    user = models.OneToOneField(CustomUser, on_delete=models.CASCADE, primary_key=True,
+                                related_name="notification_counter")
+    unread = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.user_id}: {self.unread} unread"
+
+
+# 🔹 Read notifications moved out of the hot table by archive_notifications
+class ArchivedNotification(models.Model):
+    id = models.BigIntegerField(primary_key=True)  # the original Notification id
+    recipient = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name="archived_notifications")
+    message = models.TextField()
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["recipient", "created_at"], name="archived_notif_recipient_idx"),
+        ]
+
 
 
 
@@ -149,11 +268,95 @@ class UserData(models.Model):
         return self.email
 
 
+# 🔹 Daily compliance totals with running sums, one row per calendar day (gaps filled with zeros)
+class ComplianceRollup(models.Model):
+    date = models.DateField(unique=True)
+    compliant_users = models.PositiveIntegerField(default=0)
+    non_compliant_users = models.PositiveIntegerField(default=0)
+    total_users = models.PositiveIntegerField(default=0)
+    # sums over every day up to and including `date`
+    cum_compliant = models.BigIntegerField(default=0)
+    cum_non_compliant = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"Rollup {self.date}"
+
+
+# 🔹 One row per user per day they were non-compliant (filled by the compliance sync)
+class NonCompliantDay(models.Model):
+    date = models.DateField()
+    user = models.ForeignKey(UserData, to_field="user_id", on_delete=models.CASCADE,
+                             related_name="non_compliant_days")
+
+    class Meta:
+        constraints = [
+            # also serves "who was non-compliant on a day", paged by user
+            models.UniqueConstraint(fields=["date", "user"], name="non_compliant_day_unique"),
+        ]
+        indexes = [
+            # "which days was X non-compliant"
+            models.Index(fields=["user", "date"], name="non_compliant_user_date_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} {self.date}"
+
+
+# 🔹 Runs of non-compliant days per user, split by whether approved leave covers them
+#    (filled by myapp.reconciliation from NonCompliantDay and approved LeaveRequest ranges)
+class ComplianceDiscrepancy(models.Model):
+    ON_LEAVE = "on_leave"
+    UNEXCUSED = "unexcused"
+    KIND_CHOICES = [
+        (ON_LEAVE, "On approved leave"),
+        (UNEXCUSED, "No approved leave"),
+    ]
+
+    user = models.ForeignKey(UserData, to_field="user_id", on_delete=models.CASCADE,
+                             related_name="discrepancies")
+    # the account whose leave was matched (UserData.email = CustomUser.username); null when none matches
+    employee = models.ForeignKey(CustomUser, null=True, blank=True, on_delete=models.SET_NULL,
+                                 related_name="compliance_discrepancies")
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    start_date = models.DateField()
+    end_date = models.DateField()
+    days = models.PositiveIntegerField()  # non-compliant days in the run
+
+    class Meta:
+        indexes = [
+            # a user's runs, in order
+            models.Index(fields=["user", "start_date"], name="discrepancy_user_start_idx"),
+            # runs touching the days an incremental refresh recomputes
+            models.Index(fields=["end_date"], name="discrepancy_end_idx"),
+            # "which non-compliant days were approved leave" across the org
+            models.Index(fields=["kind", "start_date"], name="discrepancy_kind_start_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} {self.kind} {self.start_date}..{self.end_date}"
+
+
+# 🔹 High-water mark of an incremental sync (see myapp.compliance.run_compliance_sync)
+class SyncCheckpoint(models.Model):
+    source = models.CharField(max_length=100, unique=True)
+    high_water_mark = models.DateField(null=True, blank=True)  # every day up to here is synced
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.source}: {self.high_water_mark}"
+
+
 class ChatHistory(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     prompt = models.TextField()
     response = models.TextField()
     timestamp = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # last N chats of a user
+            models.Index(fields=["user", "timestamp"], name="chat_user_timestamp_idx"),
+        ]
+
     def __str__(self):
         return f"Chat by {self.user.username} on {self.timestamp.strftime('%Y-%m-%d %H:%M')}"
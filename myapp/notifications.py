@@ -0,0 +1,233 @@
+#notifications.py
+"""
+Notification fan-out and delivery.
+
+Events (a leave request for the project leads, a review decision for the
+employee, review reminders for approvers) resolve their distinct
+recipients in one query and go through fan_out(), which writes every
+notification with a single bulk_create.
+
+NotificationCounter keeps each user's unread count, bumped by fan_out()
+and lowered by acknowledge(), so badges never count rows. Notifications
+created any other way (admin, bulk imports) need
+rebuild_notification_counters(). archive_read_notifications() moves old
+read rows to ArchivedNotification in batches to keep the hot table small.
+
+notification_stream (views.py) serves each user's unread notifications as
+server-sent events. The stream starts after the last id the client has
+seen (Last-Event-ID, sent automatically by EventSource on reconnect, or
+?after=), then pushes new rows as they are created. Reading a
+notification never marks it read; clients acknowledge explicitly through
+acknowledge_notifications.
+
+The stream ends after STREAM_MAX_SECONDS and EventSource reconnects, so a
+worker is never held indefinitely and deploys drain cleanly.
+"""
+import asyncio
+import json
+import time
+from collections import Counter, defaultdict
+
+from asgiref.sync import sync_to_async
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Case, Count, F, When
+
+from .models import ArchivedNotification, LeaveRequest, Notification, NotificationCounter, Project, ProjectMember
+
+STREAM_POLL_SECONDS = 2
+STREAM_MAX_SECONDS = 55
+HEARTBEAT_SECONDS = 15
+DASHBOARD_NOTIFICATIONS = 50  # latest unread rows rendered on a dashboard; the badge shows the full count
+RECONNECT_MS = 3000
+BATCH_SIZE = 100
+ARCHIVE_BATCH_SIZE = 1000
+
+
+# ---------------- Fan-out ---------------- #
+
+def fan_out(notifications):
+    """
+    Write (recipient_id, message) pairs as Notification rows in one
+    bulk_create. Exact duplicates and missing recipients are dropped.
+    Returns the created notifications.
+    """
+    pairs = list(dict.fromkeys((r, m) for r, m in notifications if r is not None))
+    if not pairs:
+        return []
+    with transaction.atomic():
+        created = Notification.objects.bulk_create([
+            Notification(recipient_id=recipient_id, message=message) for recipient_id, message in pairs
+        ])
+        _add_unread(Counter(recipient_id for recipient_id, _ in pairs))
+    return created
+
+
+# ---------------- Unread counters ---------------- #
+
+def _add_unread(per_user):
+    """Increase unread counters by {user_id: n}: one insert for missing rows, one update per distinct n."""
+    NotificationCounter.objects.bulk_create(
+        [NotificationCounter(user_id=user_id) for user_id in per_user], ignore_conflicts=True
+    )
+    by_amount = defaultdict(list)
+    for user_id, n in per_user.items():
+        by_amount[n].append(user_id)
+    for n, user_ids in by_amount.items():
+        NotificationCounter.objects.filter(user_id__in=user_ids).update(unread=F("unread") + n)
+
+
+def _remove_unread(user_id, n):
+    # Case instead of Greatest(unread - n, 0): the column is unsigned on MySQL
+    NotificationCounter.objects.filter(user_id=user_id).update(
+        unread=Case(When(unread__gt=n, then=F("unread") - n), default=0)
+    )
+
+
+def unread_count(user_id):
+    return NotificationCounter.objects.filter(user_id=user_id).values_list("unread", flat=True).first() or 0
+
+
+def rebuild_notification_counters():
+    """Recount every user's unread notifications (after bulk imports or admin edits)."""
+    counts = Notification.objects.filter(is_read__in=[False]).values("recipient_id").annotate(n=Count("id"))
+    with transaction.atomic():
+        NotificationCounter.objects.all().delete()
+        NotificationCounter.objects.bulk_create(
+            [NotificationCounter(user_id=row["recipient_id"], unread=row["n"]) for row in counts], batch_size=1000
+        )
+
+
+def mark_read(user_id, ids=None, up_to=None):
+    """Mark the user's notifications read, by id list or everything up to an id. Returns rows updated."""
+    qs = Notification.objects.filter(recipient_id=user_id, is_read__in=[False])
+    if ids is not None:
+        qs = qs.filter(id__in=ids)
+    elif up_to is not None:
+        qs = qs.filter(id__lte=up_to)
+    else:
+        return 0
+    with transaction.atomic():
+        updated = qs.update(is_read=True)
+        if updated:
+            _remove_unread(user_id, updated)
+    return updated
+
+
+acknowledge = sync_to_async(mark_read)
+
+
+# ---------------- Retention ---------------- #
+
+def archive_read_notifications(older_than, batch_size=ARCHIVE_BATCH_SIZE):
+    """
+    Move read notifications created before `older_than` into
+    ArchivedNotification, one transaction per batch so locks stay short.
+    Returns the number of rows moved.
+    """
+    moved = 0
+    while True:
+        with transaction.atomic():
+            batch = list(Notification.objects.filter(
+                is_read__in=[True], created_at__lt=older_than
+            ).order_by("id")[:batch_size])
+            if not batch:
+                return moved
+            ArchivedNotification.objects.bulk_create([
+                ArchivedNotification(id=n.id, recipient_id=n.recipient_id, message=n.message, created_at=n.created_at)
+                for n in batch
+            ], ignore_conflicts=True)
+            Notification.objects.filter(id__in=[n.id for n in batch]).delete()
+        moved += len(batch)
+
+
+def notify_leads_of_request(leave):
+    """
+    Tell the leads of the employee's projects about a leave request, once
+    per lead however many of the projects they lead, skipping the
+    employee's own manager (they see it in their queue). `leave.user`
+    should be loaded.
+    """
+    lead_ids = Project.objects.filter(
+        memberships__user_id=leave.user_id, lead__isnull=False
+    ).exclude(lead_id=leave.user.manager_id).values_list("lead_id", flat=True).distinct()
+    message = f"{leave.user.username} has requested leave ({leave.start_date} → {leave.end_date})."
+    return fan_out((lead_id, message) for lead_id in lead_ids)
+
+
+def notify_leave_reviewed(leaves, reviewer):
+    """Tell each employee their leave was approved / rejected by `reviewer`."""
+    return fan_out(
+        (leave.user_id, f"Your leave request ({leave.start_date} → {leave.end_date}) was "
+                        f"{leave.status.lower()} by {reviewer.username}.")
+        for leave in leaves
+    )
+
+
+def notify_pending_reviewers(leaves):
+    """
+    Remind approvers (direct manager and project leads) of the given
+    pending leaves, with one notification per approver carrying their count.
+    """
+    owners = dict(leaves.filter(status="Pending").values_list("id", "user_id"))
+    managers = dict(LeaveRequest.objects.filter(id__in=owners).values_list("user_id", "user__manager_id"))
+    leads = {}
+    for user_id, lead_id in ProjectMember.objects.filter(
+        user_id__in=set(owners.values()), project__lead__isnull=False
+    ).values_list("user_id", "project__lead_id"):
+        leads.setdefault(user_id, set()).add(lead_id)
+
+    waiting = Counter()
+    for user_id in owners.values():
+        for approver_id in {managers.get(user_id)} | leads.get(user_id, set()):
+            if approver_id is not None:
+                waiting[approver_id] += 1
+    return fan_out(
+        (approver_id, f"You have {count} leave request(s) waiting for your review.")
+        for approver_id, count in waiting.items()
+    )
+
+
+# ---------------- Delivery ---------------- #
+
+def notification_json(notification):
+    return {
+        "id": notification.id,
+        "message": notification.message,
+        "created_at": notification.created_at,
+    }
+
+
+def sse_event(notification):
+    data = json.dumps(notification_json(notification), cls=DjangoJSONEncoder)
+    return f"id: {notification.id}\nevent: notification\ndata: {data}\n\n"
+
+
+def unread(user_id, after_id=0):
+    # is_read__in=[False]: keeps notif_recipient_unread_idx usable (see manager_dashboard)
+    return Notification.objects.filter(
+        recipient_id=user_id, is_read__in=[False], id__gt=after_id
+    ).order_by("id")
+
+
+async def notification_events(user_id, after_id=0, poll_seconds=STREAM_POLL_SECONDS,
+                              max_seconds=STREAM_MAX_SECONDS):
+    """Async iterator of SSE frames for `user_id`'s unread notifications newer than after_id."""
+    yield f"retry: {RECONNECT_MS}\n\n"
+    started = last_sent = time.monotonic()
+    while True:
+        batch = [n async for n in unread(user_id, after_id)[:BATCH_SIZE]]
+        for notification in batch:
+            yield sse_event(notification)
+            after_id = notification.id
+        now = time.monotonic()
+        if batch:
+            last_sent = now
+            if len(batch) == BATCH_SIZE:
+                continue  # backlog: drain before sleeping
+        elif now - last_sent >= HEARTBEAT_SECONDS:
+            yield ": keep-alive\n\n"  # comment frame keeps proxies from timing out the connection
+            last_sent = now
+        if now - started >= max_seconds:
+            return
+        await asyncio.sleep(poll_seconds)
@@ -0,0 +1,131 @@
+#pagination.py
+"""
+Keyset (cursor) pagination.
+
+Pages are fetched with a range predicate on the ordering columns, e.g.
+(applied_at, id) < (last applied_at, last id), so page N costs the same
+as page 1 and never uses OFFSET. The cursor is the last row's ordering
+values, base64-encoded into the query string.
+"""
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.http import JsonResponse
+
+PAGE_SIZE = 25
+
+
+def encode_cursor(values):
+    # str() keeps full microsecond precision for datetimes (DjangoJSONEncoder truncates to ms)
+    raw = json.dumps(values, default=str).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    padded = cursor + "=" * (-len(cursor) % 4)
+    return json.loads(base64.urlsafe_b64decode(padded.encode()))
+
+
+def _after(fields, values):
+    """Q for rows strictly after `values` in the given ordering (all fields same direction)."""
+    op = "lt" if fields[0].startswith("-") else "gt"
+    names = [f.lstrip("-") for f in fields]
+    condition = Q()
+    for i, name in enumerate(names):
+        step = Q(**{f"{name}__{op}": values[i]})
+        for prev, value in zip(names[:i], values[:i]):
+            step &= Q(**{prev: value})
+        condition |= step
+    return condition
+
+
+def keyset_page(request, queryset, ordering, page_size=PAGE_SIZE, param="after"):
+    """
+    One page of `queryset` ordered by `ordering` (e.g. ("-applied_at", "-id")),
+    starting after the cursor in request.GET[param].
+
+    Returns {"items", "has_next", "next_cursor", "next_query", "first_query"};
+    the *_query values are ready-made query strings for template links.
+    """
+    names = [f.lstrip("-") for f in ordering]
+    qs = queryset.order_by(*ordering)
+
+    cursor = request.GET.get(param)
+    if cursor:
+        try:
+            raw = decode_cursor(cursor)
+            if not isinstance(raw, list) or len(raw) != len(names):
+                raise ValueError("cursor does not match the ordering")
+            model = queryset.model
+            values = [model._meta.get_field(n).to_python(v) for n, v in zip(names, raw)]
+            qs = qs.filter(_after(ordering, values))
+        except (ValueError, TypeError, ValidationError):
+            pass  # bad cursor: start from the first page
+
+    items = list(qs[:page_size + 1])
+    has_next = len(items) > page_size
+    items = items[:page_size]
+
+    next_cursor = None
+    next_query = first_query = None
+    if has_next:
+        last = items[-1]
+        next_cursor = encode_cursor([getattr(last, n) for n in names])
+        query = request.GET.copy()
+        query[param] = next_cursor
+        query.pop("format", None)
+        next_query = query.urlencode()
+    if cursor:
+        query = request.GET.copy()
+        query.pop(param, None)
+        query.pop("format", None)
+        first_query = query.urlencode()
+
+    return {
+        "items": items,
+        "has_next": has_next,
+        "next_cursor": next_cursor,
+        "next_query": next_query,
+        "first_query": first_query,
+    }
+
+
+def wants_json(request):
+    return request.GET.get("format") == "json"
+
+
+def keyset_json(page, serialize):
+    """JsonResponse for a keyset page; `serialize` turns one item into a dict."""
+    return JsonResponse({
+        "results": [serialize(item) for item in page["items"]],
+        "has_next": page["has_next"],
+        "next_cursor": page["next_cursor"],
+    }, encoder=DjangoJSONEncoder)
+
+
+def leave_request_json(leave):
+    return {
+        "id": leave.id,
+        "user": leave.user.username,
+        "leave_type": leave.leave_type.name,
+        "start_date": leave.start_date,
+        "end_date": leave.end_date,
+        "reason": leave.reason,
+        "status": leave.status,
+        "applied_at": leave.applied_at,
+        "reviewed_by": leave.reviewed_by.username if leave.reviewed_by else None,
+        "review_reason": leave.review_reason,
+    }
+
+
+def user_json(user):
+    return {
+        "id": user.id,
+        "username": user.username,
+        "role": user.role,
+        "designation": user.designation,
+        "manager": user.manager.username if user.manager else None,
+    }
@@ -0,0 +1,76 @@
+#query_budget.py
+"""
+Per-view query budgets.
+
+Views declare how many SQL queries (and, loosely, how much wall time) a
+single request may cost:
+
+    @query_budget(queries=6)
+    @login_required
+    def view_requests(request): ...
+
+myapp/tests.py hits every route against a large seeded org and fails when
+a view goes over its budget. With DEBUG on, overruns are also logged at
+runtime.
+
+Async views (the notification stream) carry their budget for the route
+check but are not counted: their ORM calls run in sync_to_async threads
+and a streaming response outlives the view call.
+"""
+import logging
+import time
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+# Generous by default: wall time is only meant to catch gross regressions.
+DEFAULT_MS = 1000
+
+
+class QueryCounter:
+    """connection.execute_wrapper that counts queries."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def query_budget(queries, ms=DEFAULT_MS):
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def wrapper(request, *args, **kwargs):
+                return await view(request, *args, **kwargs)
+
+            wrapper.query_budget = queries
+            wrapper.time_budget_ms = ms
+            return wrapper
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if not settings.DEBUG:
+                return view(request, *args, **kwargs)
+
+            counter = QueryCounter()
+            started = time.perf_counter()
+            with connection.execute_wrapper(counter):
+                response = view(request, *args, **kwargs)
+            elapsed = (time.perf_counter() - started) * 1000
+            if counter.count > queries or elapsed > ms:
+                logger.warning(
+                    "%s over budget: %d queries (budget %d), %.0f ms (budget %d)",
+                    view.__name__, counter.count, queries, elapsed, ms,
+                )
+            return response
+
+        wrapper.query_budget = queries
+        wrapper.time_budget_ms = ms
+        return wrapper
+    return decorator
@@ -0,0 +1,104 @@
+#reconciliation.py
+"""
+Non-compliance vs approved leave.
+
+The compliance sync records the days each API user was non-compliant
+(NonCompliantDay); the leave ledger records approved LeaveRequest ranges.
+reconcile_compliance() joins the two: each user's sorted non-compliant
+days are merged against their sorted, coalesced leave ranges in one pass,
+and the result is written to ComplianceDiscrepancy as runs of consecutive
+days that were either covered by approved leave (on_leave) or not
+(unexcused). API users are matched to accounts by email = username.
+
+A full run reads every NonCompliantDay once (ordered by user, date) and
+every approved leave once, so it is linear in both. The sync calls it
+with `since` = the first stored day: only runs that end on or after the
+day before are rebuilt, from each user's earliest affected run onward.
+Leave approved after the fact is picked up by the next full run (the
+reconcile_compliance command).
+"""
+from collections import defaultdict
+from datetime import timedelta
+from itertools import groupby
+
+from django.db import transaction
+
+from .models import ComplianceDiscrepancy, CustomUser, LeaveRequest, NonCompliantDay
+from .work_calendar import merge_date_ranges
+
+RECONCILE_BATCH_SIZE = 5000
+
+
+def discrepancy_runs(days, leave_ranges):
+    """
+    Sorted merge of one user's ascending non-compliant days with their
+    sorted, disjoint leave ranges. Returns [kind, start, end, days] runs of
+    consecutive calendar days of the same kind.
+    """
+    runs, i = [], 0
+    for day in days:
+        while i < len(leave_ranges) and leave_ranges[i][1] < day:
+            i += 1
+        covered = i < len(leave_ranges) and leave_ranges[i][0] <= day
+        kind = ComplianceDiscrepancy.ON_LEAVE if covered else ComplianceDiscrepancy.UNEXCUSED
+        if runs and runs[-1][0] == kind and runs[-1][2] + timedelta(days=1) == day:
+            runs[-1][2] = day
+            runs[-1][3] += 1
+        else:
+            runs.append([kind, day, day, 1])
+    return runs
+
+
+def _leave_ranges(since=None):
+    """{lowercased username: merged [start, end] ranges of approved leave (ending on/after since)}."""
+    leaves = LeaveRequest.objects.filter(status="Approved").order_by("user_id", "start_date")
+    if since is not None:
+        leaves = leaves.filter(end_date__gte=since)
+    ranges = defaultdict(list)
+    for username, start, end in leaves.values_list("user__username", "start_date", "end_date"):
+        ranges[username.lower()].append((start, end))
+    return {username: merge_date_ranges(r) for username, r in ranges.items()}
+
+
+def reconcile_compliance(since=None):
+    """
+    Rebuild ComplianceDiscrepancy, for everything (since=None) or from
+    `since` onward. Returns runs written.
+    """
+    with transaction.atomic():
+        starts = {}  # user_id -> first day to recompute, for users with a run reaching into the window
+        if since is None:
+            ComplianceDiscrepancy.objects.all().delete()
+            floor = None
+        else:
+            # a run ending the day before `since` may continue into it, so it is rebuilt too
+            touching = ComplianceDiscrepancy.objects.filter(end_date__gte=since - timedelta(days=1))
+            for user_id, start in touching.values_list("user_id", "start_date"):
+                starts[user_id] = min(start, starts.get(user_id, start))
+            floor = min([since, *starts.values()])
+            touching.delete()
+
+        accounts = {username.lower(): pk for username, pk in CustomUser.objects.values_list("username", "id")}
+        leave = _leave_ranges(floor)
+        facts = NonCompliantDay.objects.order_by("user_id", "date").values_list("user_id", "user__email", "date")
+        if floor is not None:
+            facts = facts.filter(date__gte=floor)
+
+        rows, written = [], 0
+        for user_id, group in groupby(facts.iterator(chunk_size=RECONCILE_BATCH_SIZE), key=lambda row: row[0]):
+            group = list(group)
+            email = group[0][1].lower()
+            first = starts.get(user_id, since)
+            days = [day for _, _, day in group if first is None or day >= first]
+            for kind, start, end, count in discrepancy_runs(days, leave.get(email, [])):
+                rows.append(ComplianceDiscrepancy(
+                    user_id=user_id, employee_id=accounts.get(email), kind=kind,
+                    start_date=start, end_date=end, days=count,
+                ))
+            if len(rows) >= RECONCILE_BATCH_SIZE:
+                ComplianceDiscrepancy.objects.bulk_create(rows)
+                written += len(rows)
+                rows = []
+        ComplianceDiscrepancy.objects.bulk_create(rows)
+        written += len(rows)
+    return written
@@ -0,0 +1,13 @@
+// Leave calendar helpers shared by the balance and non-compliance pages.
+
+// ranges are sorted, disjoint ["YYYY-MM-DD", "YYYY-MM-DD"] pairs (work_calendar.date_ranges_json)
+function inLeaveRanges(ranges, dateStr) {
+    var lo = 0, hi = ranges.length - 1;
+    while (lo <= hi) {
+        var mid = (lo + hi) >> 1;
+        if (dateStr < ranges[mid][0]) { hi = mid - 1; }
+        else if (dateStr > ranges[mid][1]) { lo = mid + 1; }
+        else { return true; }
+    }
+    return false;
+}
@@ -1,3 +1,948 @@
+import gzip
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+from datetime import date, timedelta
+from unittest import mock
+
+from django.db import IntegrityError, connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import urls as myapp_urls
+from .checks import check_hot_query_indexes
+from .compliance import (
+    ComplianceFetcher, dump_compliance, merge_user_dates, rebuild_non_compliant_days, rebuild_user_dates,
+    refresh_rollups, rolling_compliance, run_compliance_sync, store_compliance_days, sync_compliance,
+    upsert_user_dates,
+)
+from .reconciliation import reconcile_compliance
+from .admin import LeaveRequestAdmin
+from .ledger import bulk_set_leave_status, set_leave_status, submit_leave, update_leave_dates
+from .availability import rebuild_project_absence, users_out_on
+from .jsonstream import JSONArrayStream
+from .pagination import encode_cursor
+from .views import get_manager_reports_context
+from .upstream import CircuitBreaker, CircuitOpen, stale_while_revalidate
+from .notifications import (
+    DASHBOARD_NOTIFICATIONS, archive_read_notifications, mark_read, notification_events, notify_leads_of_request,
+    rebuild_notification_counters, unread_count,
+)
+from .hierarchy import all_managers, all_reports, approver_ids, rebuild_org_closure, skip_level_reports
+from . import ledger, work_calendar
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.exceptions import ValidationError
+from django.contrib import admin
+from django.forms import modelform_factory
+
+from .models import (
+    ArchivedNotification, ChatHistory, ComplianceDiscrepancy, ComplianceRecord, CustomUser, Holiday, LeaveBalance,
+    LeaveRequest, LeaveType, NonCompliantDay, Notification, OrgClosure, Project, ProjectAbsence, ProjectMember,
+    SyncCheckpoint, UserData,
+)
+
+MANAGERS = 5
+EMPLOYEES_PER_MANAGER = 20
+LEAVES_PER_EMPLOYEE = 6
+COMPLIANCE_DAYS = 180
+
+
+def seed_org():
+    """A synthetic org big enough that any per-row query shows up as a budget overrun."""
+    leave_types = LeaveType.objects.bulk_create(
+        [LeaveType(name=name, yearly_limit=30) for name in ("Casual", "Sick", "Earned", "Comp Off", "Maternity", "Unpaid")]
+    )
+    hr = CustomUser.objects.create_user(username="hr@example.com", password="x", role="hr")
+    managers = [
+        CustomUser.objects.create_user(username=f"manager{m}@example.com", password="x", role="manager")
+        for m in range(MANAGERS)
+    ]
+    employees = CustomUser.objects.bulk_create([
+        CustomUser(username=f"employee{m}-{e}@example.com", role="employee", manager=managers[m],
+                   designation="Developer")
+        for m in range(MANAGERS) for e in range(EMPLOYEES_PER_MANAGER)
+    ])
+    rebuild_org_closure()  # bulk_create skips the closure signals
+    projects = Project.objects.bulk_create([
+        Project(name=f"Project {m}", lead=managers[m], status="Active") for m in range(MANAGERS)
+    ])
+    memberships = []
+    for i, emp in enumerate(employees):
+        memberships.append(ProjectMember(user=emp, project=projects[i % MANAGERS], role_in_project="Dev"))
+        memberships.append(ProjectMember(user=emp, project=projects[(i + 1) % MANAGERS], role_in_project="Reviewer"))
+    ProjectMember.objects.bulk_create(memberships)
+
+    start = date(2025, 1, 6)
+    leaves = []
+    for i, emp in enumerate(employees + managers):
+        for n in range(LEAVES_PER_EMPLOYEE):
+            day = start + timedelta(days=14 * n + i % 5)
+            leaves.append(LeaveRequest(
+                user=emp, leave_type=leave_types[n % len(leave_types)], start_date=day, end_date=day + timedelta(days=1),
+                reason="Seeded", status=("Approved", "Rejected", "Pending")[n % 3], reviewed_by=hr,
+                review_reason="Seeded",
+            ))
+    LeaveRequest.objects.bulk_create(leaves)
+    LeaveBalance.objects.bulk_create([
+        LeaveBalance(user=u, leave_type=lt, total=30, used=2, pending=2, remaining=28)
+        for u in employees + managers for lt in leave_types
+    ])
+    Notification.objects.bulk_create([
+        Notification(recipient=m, message=f"Seeded notification {i}") for m in managers for i in range(30)
+    ])
+    rebuild_notification_counters()
+    ChatHistory.objects.bulk_create([
+        ChatHistory(user=u, prompt="hi", response="hello") for u in managers for _ in range(10)
+    ])
+
+    today = date(2025, 6, 30)
+    users_json = [{"id": i, "email": f"employee{i}@example.com"} for i in range(200)]
+    ComplianceRecord.objects.bulk_create([
+        ComplianceRecord(date=today - timedelta(days=d), total_users=300, compliant_users=100,
+                         non_compliant_users=200, users=users_json)
+        for d in range(COMPLIANCE_DAYS)
+    ])
+    UserData.objects.bulk_create([
+        UserData(user_id=i, email=f"employee{i}@example.com", dates=["2025-06-02", "2025-06-03"])
+        for i in range(200)
+    ])
+    rebuild_non_compliant_days()
+    refresh_rollups()
+    reconcile_compliance()
+    return {
+        "hr": hr,
+        "managers": managers,
+        "employees": employees,
+        "leave_types": leave_types,
+        "compliance_date": today,
+    }
+
+
+class QueryBudgetTests(TestCase):
+    """
+    Hits every route in myapp/urls.py as each role and checks the query count
+    and wall time against the budget declared on the view (@query_budget).
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.org = seed_org()
+        cls.hr = cls.org["hr"]
+        cls.manager = cls.org["managers"][0]
+        cls.employee = cls.org["employees"][0]
+        cls.roles = {"employee": cls.employee, "manager": cls.manager, "hr": cls.hr}
+
+    def setUp(self):
+        work_calendar._calendar = None
+        cache.clear()
+        patches = [
+            mock.patch("requests.get", return_value=mock.Mock(status_code=503)),
+            mock.patch("myapp.utils.get_leave_decision_with_ai", return_value="• Seeded suggestion"),
+            mock.patch("myapp.views.chat_with_ai", return_value="<p>Seeded answer</p>"),
+            mock.patch("myapp.upstream.submit"),  # background refreshes are not part of a request
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+    def pending_leave(self):
+        """A fresh pending leave of a direct report of self.manager (used by review routes)."""
+        return LeaveRequest.objects.create(
+            user=self.employee, leave_type=self.org["leave_types"][0], start_date=date(2025, 9, 1),
+            end_date=date(2025, 9, 2), reason="Budget check",
+        )
+
+    def bulk_body(self):
+        return {"leave_ids": [self.pending_leave().id for _ in range(10)], "action": "approve"}
+
+    def route_requests(self):
+        """(url name, kwargs factory, method, body or body factory) for every route."""
+        leave = lambda: {"leave_id": self.pending_leave().id}
+        compliance_day = self.org["compliance_date"].isoformat()
+        return {
+            "login": (dict, "get", None),
+            "logout": (dict, "get", None),
+            "user_dashboard": (dict, "get", None),
+            "apply_leave": (dict, "post", {"leave_type": self.org["leave_types"][1].id, "start_date": "2025-10-06",
+                                           "end_date": "2025-10-07", "reason": "Budget check"}),
+            "view_requests": (dict, "get", None),
+            "view_balance": (dict, "get", None),
+            "dashboard": (dict, "get", None),
+            "review_leave_request": (leave, "get", None),
+            "approve_leave": (leave, "post", {"reason": "ok"}),
+            "reject_leave": (leave, "post", {"reason": "no"}),
+            "bulk_review_leaves": (dict, "json", self.bulk_body),
+            "define_leave": (dict, "get", None),
+            "set_limits": (dict, "get", None),
+            "view_reports": (dict, "get", None),
+            "list_users": (lambda: {"role": "employee"}, "get", None),
+            "user_report": (lambda: {"user_id": self.employee.id}, "get", None),
+            "spark_finch_users": (dict, "get", {"date": compliance_day}),
+            "user_non_compliance_list": (dict, "get", None),
+            "user_non_compliance_detail": (lambda: {"user_id": 1}, "get", None),
+            "mock_user_list": (dict, "get", None),
+            "mock_user_detail": (lambda: {"user_id": self.employee.id}, "get", None),
+            "manager_dashboard": (dict, "get", None),
+            "manager_leave_request_detail": (leave, "get", None),
+            "manager_approve_leave": (leave, "post", {"reason": "ok"}),
+            "manager_reject_leave": (leave, "post", {"reason": "no"}),
+            "manager_bulk_review_leaves": (dict, "json", self.bulk_body),
+            "manager_apply_leave": (dict, "post", {"leave_type": self.org["leave_types"][2].id,
+                                                   "start_date": "2025-10-13", "end_date": "2025-10-14",
+                                                   "reason": "Budget check"}),
+            "manager_view_requests": (dict, "get", None),
+            "manager_reports": (dict, "get", None),
+            "manager_leave_balance": (dict, "get", None),
+            "manager_team_coverage": (dict, "get", {"start": "2025-01-01", "end": "2025-03-31"}),
+            "notify_team_leads": (leave, "get", None),
+            "chat": (dict, "chat", None),
+            "notification_stream": (dict, "get", None),
+            "acknowledge_notifications": (dict, "json", {"up_to": 10 ** 9}),
+        }
+
+    def call(self, name, kwargs, method, body, role):
+        url = reverse(name, kwargs=kwargs)
+        if method == "post":
+            return self.client.post(url, body)
+        if method == "json":
+            return self.client.post(url, json.dumps(body), content_type="application/json")
+        if method == "chat":
+            return self.client.post(url, json.dumps({"message": "Can I take Friday off?", "role": role}),
+                                    content_type="application/json")
+        return self.client.get(url, body)
+
+    def test_every_route_declares_a_budget(self):
+        missing = [str(p.pattern) for p in myapp_urls.urlpatterns if not hasattr(p.callback, "query_budget")]
+        self.assertEqual(missing, [], "Add @query_budget(...) to these views")
+
+    def test_every_route_is_exercised(self):
+        names = {p.name for p in myapp_urls.urlpatterns if p.name}
+        self.assertEqual(names - set(self.route_requests()), set())
+
+    def test_views_stay_within_budget(self):
+        callbacks = {p.name: p.callback for p in myapp_urls.urlpatterns if p.name}
+        overruns = []
+        for name, (kwargs_factory, method, body) in self.route_requests().items():
+            budget = callbacks[name].query_budget
+            time_budget = callbacks[name].time_budget_ms
+            for role, user in self.roles.items():
+                with self.subTest(view=name, role=role):
+                    self.client.force_login(user)
+                    kwargs = kwargs_factory()
+                    data = body() if callable(body) else body
+                    with CaptureQueriesContext(connection) as ctx:
+                        started = time.perf_counter()
+                        response = self.call(name, kwargs, method, data, role)
+                        elapsed = (time.perf_counter() - started) * 1000
+                    self.assertLess(response.status_code, 500)
+                    if len(ctx) > budget or elapsed > time_budget:
+                        overruns.append(
+                            f"{name} as {role}: {len(ctx)} queries (budget {budget}), "
+                            f"{elapsed:.0f} ms (budget {time_budget})"
+                        )
+        self.assertEqual(overruns, [], "\n" + "\n".join(overruns))
+
+
+class IndexUsageTests(TestCase):
+    """EXPLAIN every hot query (myapp/checks.py) and require its composite index."""
+
+    @classmethod
+    def setUpTestData(cls):
+        seed_org()
+
+    def test_hot_queries_use_their_indexes(self):
+        warnings = check_hot_query_indexes(None, databases=["default"])
+        self.assertEqual(warnings, [], "\n".join(f"{w.msg}\n{w.hint}" for w in warnings))
+
+
+class BadInputTests(TestCase):
+    """Malformed form, query and JSON input gets a 4xx, never a 500."""
+
+    def setUp(self):
+        self.hr = CustomUser.objects.create_user(username="hr", password="x", role="hr")
+        self.client.force_login(self.hr)
+
+    def test_redefining_a_leave_type_resyncs_its_balances(self):
+        leave_type = LeaveType.objects.create(name="Annual", yearly_limit=10)
+        LeaveBalance.objects.create(user=self.hr, leave_type=leave_type, total=10, used=4, pending=0, remaining=6)
+
+        response = self.client.post(reverse("define_leave"), {"name": "Annual", "yearly_limit": "15"})
+        self.assertEqual(response.status_code, 302)
+        balance = LeaveBalance.objects.get(user=self.hr, leave_type=leave_type)
+        self.assertEqual((balance.total, balance.remaining), (15, 11))
+
+        response = self.client.post(reverse("define_leave"), {"name": "Annual", "yearly_limit": "lots"})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(LeaveType.objects.get(pk=leave_type.pk).yearly_limit, 15)
+
+    def test_malformed_cursor_falls_back_to_the_first_page(self):
+        for raw in ([], [1], {"a": 1}, "x", [None, None]):
+            cursor = encode_cursor(raw)
+            response = self.client.get(reverse("dashboard"), {"after": cursor})
+            self.assertEqual(response.status_code, 200, raw)
+        self.assertEqual(self.client.get(reverse("dashboard"), {"after": "%%%"}).status_code, 200)
+
+    def test_malformed_bulk_review_bodies_are_rejected(self):
+        url = reverse("bulk_review_leaves")
+        for body in ("{not json", "[1, 2]", '"approve"', '{"action": "approve", "leave_ids": "12"}',
+                     '{"action": "approve", "leave_ids": [1, "x"]}', '{"action": "approve", "leave_ids": {"1": 1}}',
+                     '{"action": "approve", "leave_ids": [1], "reason": 5}', '{"action": "archive"}'):
+            response = self.client.post(url, body, content_type="application/json")
+            self.assertEqual(response.status_code, 400, body)
+            self.assertIn("error", response.json())
+
+    def test_bad_coverage_windows_are_rejected(self):
+        url = reverse("manager_team_coverage")
+        for params in ({"start": "2025-13-01"}, {"start": "yesterday"}, {"start": "2025-09-10", "end": "2025-09-01"},
+                       {"start": "2025-01-01", "end": "2030-01-01"}):
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, 400, params)
+            self.assertIn("error", response.json())
+        self.assertEqual(self.client.get(url, {"start": "2025-09-01", "end": "2025-09-30"}).status_code, 200)
+
+    def test_leave_dates_outside_the_calendar_are_rejected(self):
+        leave_type = LeaveType.objects.create(name="Annual", yearly_limit=10)
+        form = {"leave_type": leave_type.id, "start_date": "2100-01-04", "end_date": "2100-01-05", "reason": "x"}
+        response = self.client.post(reverse("apply_leave"), form, follow=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Leave dates must be between")
+        self.assertFalse(LeaveRequest.objects.exists())
+
+        leave = submit_leave(self.hr, leave_type, date(2025, 9, 1), date(2025, 9, 2), "x")
+        with self.assertRaises(ValidationError):
+            update_leave_dates(leave, date(1999, 12, 31), date(2025, 9, 2))
+        leave.refresh_from_db()
+        self.assertEqual((leave.start_date, leave.days), (date(2025, 9, 1), 2))
+
+
+class LeaveLedgerTests(TestCase):
+    """LeaveBalance follows leave status changes without drifting when holidays change."""
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username="emp", password="x")
+        self.leave_type = LeaveType.objects.create(name="Annual", yearly_limit=20)
+
+    def balance(self):
+        b = LeaveBalance.objects.get(user=self.user, leave_type=self.leave_type)
+        return b.used, b.pending, b.remaining
+
+    def test_holiday_edits_do_not_change_posted_days(self):
+        # Mon 1 Sep - Fri 5 Sep 2025
+        leave = submit_leave(self.user, self.leave_type, date(2025, 9, 1), date(2025, 9, 5), "trip")
+        other = submit_leave(self.user, self.leave_type, date(2025, 9, 8), date(2025, 9, 9), "trip")
+        self.assertEqual(self.balance(), (0, 7, 20))
+
+        holiday = Holiday.objects.create(date=date(2025, 9, 3), name="Midweek")
+        set_leave_status(leave, "Approved")
+        self.assertEqual(self.balance(), (5, 2, 15))
+
+        holiday.delete()
+        Holiday.objects.create(date=date(2025, 9, 8), name="Monday")
+        bulk_set_leave_status(LeaveRequest.objects.all(), [other.id], "Approved", self.user)
+        set_leave_status(leave, "Rejected")
+        set_leave_status(LeaveRequest.objects.get(pk=other.pk), "Rejected")
+        self.assertEqual(self.balance(), (0, 0, 20))
+
+    def absent_days(self):
+        return sum(ProjectAbsence.objects.values_list("count", flat=True))
+
+    def test_admin_edits_and_deletes_post_to_the_ledger(self):
+        project = Project.objects.create(name="Apollo")
+        ProjectMember.objects.create(user=self.user, project=project)
+        model_admin = LeaveRequestAdmin(LeaveRequest, admin.site)
+
+        leave = submit_leave(self.user, self.leave_type, date(2025, 9, 1), date(2025, 9, 5), "trip")
+        set_leave_status(leave, "Approved")
+        self.assertEqual((self.balance(), self.absent_days()), ((5, 0, 15), 5))
+
+        leave.status = "Rejected"
+        model_admin.save_model(None, leave, None, True)
+        self.assertEqual((self.balance(), self.absent_days()), ((0, 0, 20), 0))
+
+        # approved again with other dates, on another leave type
+        sick = LeaveType.objects.create(name="Sick", yearly_limit=10)
+        leave.status, leave.leave_type, leave.end_date = "Approved", sick, date(2025, 9, 2)
+        model_admin.save_model(None, leave, None, True)
+        self.assertEqual(self.balance(), (0, 0, 20))
+        self.assertEqual(LeaveBalance.objects.get(user=self.user, leave_type=sick).used, 2)
+        self.assertEqual(self.absent_days(), 2)
+
+        model_admin.delete_model(None, leave)
+        self.assertEqual(LeaveBalance.objects.get(user=self.user, leave_type=sick).used, 0)
+        self.assertEqual(self.absent_days(), 0)
+
+    def test_admin_created_and_deleted_pending_leave(self):
+        leave = LeaveRequest(user=self.user, leave_type=self.leave_type, start_date=date(2025, 9, 1),
+                             end_date=date(2025, 9, 3), reason="x", status="Pending")
+        LeaveRequestAdmin(LeaveRequest, admin.site).save_model(None, leave, None, False)
+        self.assertEqual((leave.days, self.balance()), (3, (0, 3, 20)))
+        LeaveRequest.objects.filter(pk=leave.pk).delete()  # the admin's bulk delete action
+        self.assertEqual(self.balance(), (0, 0, 20))
+
+    def test_bulk_review_posts_once_per_balance(self):
+        sick = LeaveType.objects.create(name="Sick", yearly_limit=10)
+        other = CustomUser.objects.create_user(username="other", password="x")
+        first = submit_leave(self.user, self.leave_type, date(2025, 9, 1), date(2025, 9, 2), "x")
+        second = submit_leave(self.user, self.leave_type, date(2025, 9, 8), date(2025, 9, 10), "x")
+        flu = submit_leave(self.user, sick, date(2025, 9, 15), date(2025, 9, 15), "x")
+        done = set_leave_status(submit_leave(self.user, sick, date(2025, 9, 22), date(2025, 9, 22), "x"), "Approved")
+        outside = submit_leave(other, self.leave_type, date(2025, 9, 1), date(2025, 9, 1), "x")
+
+        ids = [flu.id, first.id, done.id, outside.id, 999999, second.id]
+        with mock.patch.object(ledger, "_post_days", wraps=ledger._post_days) as post:
+            results = bulk_set_leave_status(LeaveRequest.objects.filter(user=self.user), ids, "Approved", other)
+        self.assertEqual(results, {
+            flu.id: "Approved", first.id: "Approved", second.id: "Approved", done.id: "Not pending",
+            outside.id: "Not found or not authorized", 999999: "Not found or not authorized",
+        })
+        keys = sorted([(self.user.id, self.leave_type.id), (self.user.id, sick.id)])
+        self.assertEqual([(c.args[0], c.args[1].id) for c in post.call_args_list], keys)
+        self.assertEqual(self.balance(), (5, 0, 15))
+        sick_balance = LeaveBalance.objects.get(user=self.user, leave_type=sick)
+        self.assertEqual((sick_balance.used, sick_balance.pending), (2, 0))
+        outside.refresh_from_db()
+        self.assertEqual(outside.status, "Pending")
+
+    def test_pending_days_are_reserved_until_reviewed(self):
+        # 20 days: two full weeks are pending, then a third week does not fit
+        first = submit_leave(self.user, self.leave_type, date(2025, 9, 1), date(2025, 9, 12), "x")
+        submit_leave(self.user, self.leave_type, date(2025, 9, 15), date(2025, 9, 26), "x")
+        self.assertEqual(self.balance(), (0, 20, 20))
+        with self.assertRaisesMessage(ValidationError, "no remaining Annual leave"):
+            submit_leave(self.user, self.leave_type, date(2025, 10, 6), date(2025, 10, 6), "x")
+
+        set_leave_status(first, "Rejected")
+        self.assertEqual(self.balance(), (0, 10, 20))
+        with self.assertRaisesMessage(ValidationError, "only have 10 days left"):
+            submit_leave(self.user, self.leave_type, date(2025, 10, 6), date(2025, 10, 20), "x")
+        submit_leave(self.user, self.leave_type, date(2025, 10, 6), date(2025, 10, 17), "x")
+        self.assertEqual(self.balance(), (0, 20, 20))
+
+    def test_overlapping_submission_is_refused(self):
+        submit_leave(self.user, self.leave_type, date(2025, 9, 1), date(2025, 9, 5), "trip")
+        sick = LeaveType.objects.create(name="Sick", yearly_limit=10)
+        with self.assertRaisesMessage(ValidationError, "overlap"):
+            submit_leave(self.user, sick, date(2025, 9, 5), date(2025, 9, 8), "flu")
+        self.assertFalse(LeaveBalance.objects.filter(user=self.user, leave_type=sick, pending__gt=0).exists())
+        submit_leave(self.user, sick, date(2025, 9, 8), date(2025, 9, 8), "flu")
+        self.assertEqual(LeaveRequest.objects.filter(user=self.user).count(), 2)
+
+
+class ProjectAbsenceTests(TestCase):
+    """The incrementally maintained headcount matches a full rebuild_project_absence()."""
+
+    def snapshot(self):
+        return sorted(ProjectAbsence.objects.filter(count__gt=0).values_list("project_id", "date", "count"))
+
+    def assertMatchesRebuild(self):
+        incremental = self.snapshot()
+        rebuild_project_absence()
+        self.assertEqual(incremental, self.snapshot())
+        return incremental
+
+    def test_membership_changes_are_posted(self):
+        leave_type = LeaveType.objects.create(name="Annual", yearly_limit=30)
+        apollo, gemini = Project.objects.create(name="Apollo"), Project.objects.create(name="Gemini")
+        ann = CustomUser.objects.create_user(username="ann", password="x")
+        bob = CustomUser.objects.create_user(username="bob", password="x")
+        ProjectMember.objects.create(user=ann, project=apollo)
+        for user, start, end in ((ann, 1, 5), (bob, 3, 9), (bob, 15, 16)):
+            set_leave_status(submit_leave(user, leave_type, date(2025, 9, start), date(2025, 9, end), "x"), "Approved")
+        self.assertEqual(len(self.assertMatchesRebuild()), 5)
+
+        bob_apollo = ProjectMember.objects.create(user=bob, project=apollo)
+        ProjectMember.objects.create(user=bob, project=apollo)  # duplicate row: counted once
+        self.assertIn((apollo.id, date(2025, 9, 3), 2), self.assertMatchesRebuild())
+
+        bob_apollo.project = gemini
+        bob_apollo.save()
+        self.assertMatchesRebuild()
+        ProjectMember.objects.filter(user=bob, project=apollo).delete()
+        ann.projectmember_set.all().delete()
+        self.assertEqual([pid for pid, _, _ in self.assertMatchesRebuild()], [gemini.id] * 9)
+
+        gemini.delete()
+        bob.delete()
+        self.assertEqual(self.assertMatchesRebuild(), [])
+
+    def test_users_out_on(self):
+        leave_type = LeaveType.objects.create(name="Annual", yearly_limit=30)
+        apollo = Project.objects.create(name="Apollo")
+        ann = CustomUser.objects.create_user(username="ann", password="x")
+        bob = CustomUser.objects.create_user(username="bob", password="x")
+        cat = CustomUser.objects.create_user(username="cat", password="x")
+        for user in (ann, bob):
+            ProjectMember.objects.create(user=user, project=apollo)
+        set_leave_status(submit_leave(ann, leave_type, date(2025, 9, 1), date(2025, 9, 5), "x"), "Approved")
+        submit_leave(bob, leave_type, date(2025, 9, 3), date(2025, 9, 3), "x")
+        submit_leave(cat, leave_type, date(2025, 9, 3), date(2025, 9, 3), "x")  # not on the project
+
+        self.assertEqual(list(users_out_on(apollo, date(2025, 9, 3))), [ann])
+        self.assertEqual(set(users_out_on(apollo, date(2025, 9, 3), statuses=("Approved", "Pending"))), {ann, bob})
+        self.assertFalse(users_out_on(apollo, date(2025, 9, 8)).exists())
+
+
+class OrgHierarchyTests(TestCase):
+    """The closure table follows CustomUser.manager through saves, moves and deletes."""
+
+    def setUp(self):
+        cache.clear()
+        make = lambda name, manager=None: CustomUser.objects.create_user(username=name, password="x", manager=manager)
+        self.ceo = make("ceo")
+        self.vp = make("vp", self.ceo)
+        self.lead = make("lead", self.vp)
+        self.dev = make("dev", self.lead)
+        self.other_vp = make("other_vp", self.ceo)
+
+    def names(self, qs):
+        return sorted(qs.values_list("username", flat=True))
+
+    def test_transitive_reports_and_approvers(self):
+        self.assertEqual(self.names(all_reports(self.ceo)), ["dev", "lead", "other_vp", "vp"])
+        self.assertEqual(self.names(all_reports(self.vp, max_depth=1)), ["lead"])
+        self.assertEqual(self.names(skip_level_reports(self.vp)), ["dev"])
+        self.assertEqual(list(all_managers(self.dev).values_list("username", flat=True)), ["lead", "vp", "ceo"])
+
+    def test_chatbot_context_summarises_skip_level_reports(self):
+        leave_type = LeaveType.objects.create(name="Annual", yearly_limit=30)
+        start = date.today() + timedelta(days=30)
+        submit_leave(self.lead, leave_type, start, start + timedelta(days=6), "x")
+        trip = set_leave_status(submit_leave(self.dev, leave_type, start, start + timedelta(days=6), "x"), "Approved")
+        submit_leave(self.dev, leave_type, start + timedelta(days=14), start + timedelta(days=20), "x")
+
+        context = get_manager_reports_context(self.vp)
+        self.assertEqual([u["username"] for u in context["users"]], ["lead"])
+        self.assertEqual({l["user_id"] for l in context["leave_requests"]}, {self.lead.id})
+        [dev] = context["skip_level_reports"]
+        self.assertEqual((dev["username"], dev["manager_id"]), ("dev", self.lead.id))
+        self.assertEqual((dev["pending_requests"], dev["upcoming_leave_days"]), (1, trip.days))
+
+    def test_moving_a_manager_moves_their_subtree(self):
+        self.lead.manager = self.other_vp
+        self.lead.save()
+        self.assertEqual(self.names(all_reports(self.vp)), [])
+        self.assertEqual(self.names(all_reports(self.other_vp)), ["dev", "lead"])
+        self.assertEqual(list(all_managers(self.dev).values_list("username", flat=True)), ["lead", "other_vp", "ceo"])
+
+    def test_cycles_are_rejected(self):
+        self.ceo.manager = self.dev
+        with self.assertRaises(ValidationError) as raised:
+            self.ceo.full_clean()
+        self.assertIn("manager", raised.exception.message_dict)
+        with self.assertRaises(IntegrityError):
+            self.ceo.save()
+
+    def test_model_forms_report_a_cycle_as_a_field_error(self):
+        # the admin change form is a ModelForm too
+        form = modelform_factory(CustomUser, fields=["manager"])({"manager": self.dev.pk}, instance=self.ceo)
+        self.assertFalse(form.is_valid())
+        self.assertIn("manager", form.errors)
+
+    def test_deleting_a_manager_detaches_their_reports(self):
+        self.vp.delete()
+        self.assertEqual(self.names(all_reports(self.ceo)), ["other_vp"])
+        self.assertEqual(list(all_managers(self.dev).values_list("username", flat=True)), ["lead"])
+
+    def test_rebuild_matches_incremental_maintenance(self):
+        self.lead.manager = self.other_vp
+        self.lead.save()
+        maintained = set(OrgClosure.objects.values_list("ancestor_id", "descendant_id", "depth"))
+        rebuild_org_closure()
+        self.assertEqual(set(OrgClosure.objects.values_list("ancestor_id", "descendant_id", "depth")), maintained)
+
+    def test_approver_set_follows_manager_and_project_changes(self):
+        project = Project.objects.create(name="Apollo", lead=self.other_vp)
+        self.assertEqual(approver_ids(self.dev.id), {self.lead.id})
+
+        membership = ProjectMember.objects.create(user=self.dev, project=project)
+        self.assertEqual(approver_ids(self.dev.id), {self.lead.id, self.other_vp.id})
+
+        project.lead = self.ceo
+        project.save()
+        self.assertEqual(approver_ids(self.dev.id), {self.lead.id, self.ceo.id})
+
+        self.dev.manager = self.vp
+        self.dev.save()
+        membership.delete()
+        with self.assertNumQueries(1):
+            self.assertEqual(approver_ids(self.dev.id), {self.vp.id})
+        with self.assertNumQueries(0):
+            approver_ids(self.dev.id)
+
+
+class NotificationStreamTests(TestCase):
+    """SSE frames follow the unread notifications; only an explicit ack marks them read."""
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username="lead", password="x", role="manager")
+        self.notes = Notification.objects.bulk_create([
+            Notification(recipient=self.user, message=f"note {i}") for i in range(3)
+        ])
+        rebuild_notification_counters()
+
+    def frames(self, after=0):
+        async def collect():
+            return [f async for f in notification_events(self.user.id, after, poll_seconds=0, max_seconds=0)]
+        return async_to_sync(collect)()
+
+    def test_stream_sends_unread_after_last_event_id(self):
+        frames = self.frames(after=self.notes[0].id)
+        self.assertTrue(frames[0].startswith("retry:"))
+        self.assertEqual([f.split("\n")[0] for f in frames[1:]], [f"id: {n.id}" for n in self.notes[1:]])
+
+    def test_dashboard_does_not_mark_read_but_ack_does(self):
+        self.client.force_login(self.user)
+        self.client.get(reverse("manager_dashboard"))
+        self.assertEqual(Notification.objects.filter(recipient=self.user, is_read=False).count(), 3)
+
+        response = self.client.post(reverse("acknowledge_notifications"),
+                                    json.dumps({"ids": [self.notes[0].id, self.notes[1].id]}),
+                                    content_type="application/json")
+        self.assertEqual(response.json(), {"acknowledged": 2, "unread": 1})
+        self.assertEqual(unread_count(self.user.id), 1)
+        self.assertEqual([f.split("\n")[0] for f in self.frames()[1:]], [f"id: {self.notes[2].id}"])
+
+    def test_dashboard_renders_only_the_latest_unread(self):
+        Notification.objects.bulk_create([
+            Notification(recipient=self.user, message=f"more {i}") for i in range(DASHBOARD_NOTIFICATIONS)
+        ])
+        rebuild_notification_counters()
+        self.client.force_login(self.user)
+        response = self.client.get(reverse("manager_dashboard"))
+        self.assertEqual(len(response.context["notifications"]), DASHBOARD_NOTIFICATIONS)
+        self.assertEqual(response.context["unread_count"], DASHBOARD_NOTIFICATIONS + 3)
+
+        response = self.client.post(reverse("acknowledge_notifications"),
+                                    json.dumps({"up_to": response.context["last_notification_id"]}),
+                                    content_type="application/json")
+        self.assertEqual(response.json(), {"acknowledged": DASHBOARD_NOTIFICATIONS + 3, "unread": 0})
+
+    def test_leads_are_notified_once_each(self):
+        manager = CustomUser.objects.create_user(username="mgr", password="x", role="manager")
+        employee = CustomUser.objects.create_user(username="emp", password="x", manager=manager)
+        projects = Project.objects.bulk_create([
+            Project(name="A", lead=self.user), Project(name="B", lead=self.user), Project(name="C", lead=manager),
+        ])
+        ProjectMember.objects.bulk_create([ProjectMember(user=employee, project=p) for p in projects])
+        leave = LeaveRequest.objects.create(
+            user=employee, leave_type=LeaveType.objects.create(name="Casual", yearly_limit=10),
+            start_date=date(2025, 9, 1), end_date=date(2025, 9, 2), reason="Trip",
+        )
+        leave = LeaveRequest.objects.select_related("user").get(pk=leave.pk)
+        # recipients, then notification + counter writes in one savepoint
+        with self.assertNumQueries(6):
+            created = notify_leads_of_request(leave)
+        self.assertEqual([n.recipient_id for n in created], [self.user.id])
+        self.assertEqual(unread_count(self.user.id), 4)
+
+    def test_read_notifications_are_archived_in_batches(self):
+        mark_read(self.user.id, ids=[self.notes[0].id, self.notes[1].id])
+        moved = archive_read_notifications(timezone.now() + timedelta(days=1), batch_size=1)
+        self.assertEqual(moved, 2)
+        self.assertEqual(list(Notification.objects.values_list("id", flat=True)), [self.notes[2].id])
+        self.assertEqual(ArchivedNotification.objects.count(), 2)
+        self.assertEqual(unread_count(self.user.id), 1)
+
+
+class StubComplianceAPI(ThreadingHTTPServer):
+    """
+    Local stand-in for the non-compliance API: `users_per_day` users per day,
+    paged by page_size with has_next (and total_pages when `total_pages`),
+    answering 429 to the first request for each page when `throttle`, or a
+    truncated 200 body when `truncate`.
+    """
+
+    def __init__(self, users_per_day=5, total_pages=False, throttle=False, truncate=False):
+        super().__init__(("127.0.0.1", 0), StubComplianceHandler)
+        self.users_per_day = users_per_day
+        self.total_pages = total_pages
+        self.throttle = throttle
+        self.truncate = truncate
+        self.requests = []
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/non-compliance/users"
+
+
+class StubComplianceHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        query = {k: v[0] for k, v in parse_qs(urlparse(self.path).query).items()}
+        day, page, page_size = query["date"], int(query["page"]), int(query["page_size"])
+        with server.lock:
+            seen = (day, page) in server.requests
+            server.requests.append((day, page))
+        if server.throttle and not seen:
+            self.send_response(429)
+            self.send_header("Retry-After", "0")
+            self.end_headers()
+            return
+
+        pages = -(-server.users_per_day // page_size)
+        offset = (page - 1) * page_size
+        users = [{"id": i, "email": f"user{i}@example.com"}
+                 for i in range(offset, min(offset + page_size, server.users_per_day))]
+        pagination = {"page": page, "page_size": page_size, "has_next": page < pages}
+        if server.total_pages:
+            pagination["total_pages"] = pages
+        body = json.dumps({"total_users": 50, "compliant_users": 50 - server.users_per_day,
+                           "non_compliant_users": server.users_per_day, "users": users,
+                           "pagination": pagination}).encode()
+        if server.truncate and not seen:
+            body = body[:len(body) // 2]
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class ComplianceFetcherTests(TestCase):
+    """The concurrent fetcher against a local stub of the non-compliance API."""
+
+    def serve(self, **options):
+        server = StubComplianceAPI(**options)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return server
+
+    def fetcher(self, server):
+        return ComplianceFetcher(url=server.url, token="t", concurrency=4, page_size=2, backoff=0)
+
+    def test_follows_has_next_and_upserts_every_day(self):
+        server = self.serve(users_per_day=5)
+        stored = sync_compliance("2025-03-01", "2025-03-10", fetcher=self.fetcher(server), batch_days=4)
+        self.assertEqual(stored, 10)
+        self.assertEqual(ComplianceRecord.objects.count(), 10)
+        record = ComplianceRecord.objects.get(date=date(2025, 3, 4))
+        self.assertEqual([u["id"] for u in record.users], [0, 1, 2, 3, 4])
+        self.assertEqual(len(server.requests), 30)
+
+        # re-running updates in place
+        sync_compliance("2025-03-01", "2025-03-10", fetcher=self.fetcher(server))
+        self.assertEqual(ComplianceRecord.objects.count(), 10)
+
+    def test_retries_throttled_pages_fetched_in_parallel(self):
+        server = self.serve(users_per_day=5, total_pages=True, throttle=True)
+        sync_compliance("2025-03-01", "2025-03-03", fetcher=self.fetcher(server))
+        self.assertEqual(len(server.requests), 18)  # 3 days x 3 pages, each throttled once
+        self.assertEqual(len(ComplianceRecord.objects.get(date=date(2025, 3, 2)).users), 5)
+
+    def test_truncated_bodies_are_retried(self):
+        server = self.serve(users_per_day=5, truncate=True)
+        self.assertEqual(sync_compliance("2025-03-01", "2025-03-02", fetcher=self.fetcher(server)), 2)
+        self.assertEqual(len(server.requests), 12)  # 2 days x 3 pages, each truncated once
+        self.assertEqual(len(ComplianceRecord.objects.get(date=date(2025, 3, 2)).users), 5)
+
+        # a page that never decodes fails its day, not the sync
+        fetcher = self.fetcher(server)
+        fetcher.retries = 0
+        server.requests.clear()
+        self.assertEqual(sync_compliance("2025-03-05", "2025-03-05", fetcher=fetcher), 0)
+
+    def test_incremental_sync_only_fetches_new_days_and_fills_user_data(self):
+        server = self.serve(users_per_day=3)
+        result = run_compliance_sync("2025-03-01", "2025-03-05", fetcher=self.fetcher(server))
+        self.assertEqual(result["high_water_mark"], date(2025, 3, 5))
+        self.assertEqual(UserData.objects.get(user_id=2).dates,
+                         ["2025-03-01", "2025-03-02", "2025-03-03", "2025-03-04", "2025-03-05"])
+
+        server.requests.clear()
+        result = run_compliance_sync(end="2025-03-07", fetcher=self.fetcher(server))
+        self.assertEqual((result["start"], result["days"]), (date(2025, 3, 6), 2))
+        self.assertEqual({day for day, _ in server.requests}, {"2025-03-06", "2025-03-07"})
+        self.assertEqual(SyncCheckpoint.objects.get().high_water_mark, date(2025, 3, 7))
+        self.assertEqual(len(UserData.objects.get(user_id=2).dates), 7)
+        self.assertEqual(NonCompliantDay.objects.filter(user_id=2).count(), 7)
+        self.assertEqual(NonCompliantDay.objects.filter(date=date(2025, 3, 7)).count(), 2)  # id 0 is skipped
+
+    def test_array_stream_decodes_items_across_chunk_boundaries(self):
+        document = {"total_users": 3, "meta": {"users": [9], "note": "a \\\"users\\\": [ é"},
+                    "users": [{"id": 1, "email": "ä@example.com"}, 12345, "x]", [1, [2]], None, 1.5e3],
+                    "pagination": {"has_next": False}}
+        raw = json.dumps(document, ensure_ascii=False).encode()
+        for size in (1, 2, 7, len(raw)):
+            stream = JSONArrayStream((raw[i:i + size] for i in range(0, len(raw), size)), "users")
+            self.assertEqual(list(stream), document["users"])
+            self.assertEqual(stream.envelope, {**document, "users": []})
+
+        stream = JSONArrayStream([b'{"detail": "Not found"}'], "users")
+        self.assertEqual(list(stream), [])
+        self.assertEqual(stream.envelope, {"detail": "Not found"})
+
+    def test_streaming_sync_writes_users_in_chunks(self):
+        server = self.serve(users_per_day=5)
+        with mock.patch("myapp.compliance.USER_DATES_CHUNK", 2):
+            result = run_compliance_sync("2025-03-01", "2025-03-03", fetcher=self.fetcher(server), stream=True)
+        self.assertEqual((result["days"], result["high_water_mark"]), (3, date(2025, 3, 3)))
+        record = ComplianceRecord.objects.get(date=date(2025, 3, 2))
+        self.assertEqual((record.users, record.non_compliant_users), ([], 5))
+        self.assertEqual(NonCompliantDay.objects.filter(date=date(2025, 3, 2)).count(), 4)  # id 0 is skipped
+        self.assertEqual(len(UserData.objects.get(user_id=4).dates), 3)
+
+        # streamed days keep their facts through a rebuild and still dump their users
+        rebuild_non_compliant_days()
+        self.assertEqual(NonCompliantDay.objects.count(), 12)
+        out = io.StringIO()
+        dump_compliance(out, "2025-03-01", "2025-03-01")
+        self.assertEqual([u["id"] for u in json.loads(out.getvalue())["users"]], [1, 2, 3, 4])
+
+    def test_user_dates_merge_as_sets_in_chunks(self):
+        UserData.objects.create(user_id=7, email="user7@example.com", dates=["2025-03-02"])
+        payloads = [
+            {"date": date(2025, 3, d), "users": [{"id": i, "email": f"user{i}@example.com"} for i in (5, 6, 7)]}
+            for d in (1, 2)
+        ]
+        with self.assertNumQueries(2 * 2):  # per chunk of 2 users: one read, one upsert
+            upsert_user_dates({7: ("user7@example.com", {"2025-03-03"}), 5: ("user5@example.com", {"2025-03-01"}),
+                               6: ("user6@example.com", {"2025-03-01"})}, chunk_size=2)
+        merge_user_dates(payloads)
+        self.assertEqual(UserData.objects.get(user_id=7).dates, ["2025-03-01", "2025-03-02", "2025-03-03"])
+        self.assertEqual(UserData.objects.get(user_id=5).dates, ["2025-03-01", "2025-03-02"])
+
+        NonCompliantDay.objects.bulk_create([NonCompliantDay(date=date(2025, 3, 9), user_id=5)])
+        self.assertEqual(rebuild_user_dates(chunk_size=1), 1)
+        self.assertEqual(UserData.objects.get(user_id=5).dates, ["2025-03-09"])
+
+    def test_rolling_windows_match_a_scan_of_the_records(self):
+        base = date(2025, 6, 30)
+        for d in list(range(0, 20)) + list(range(25, 200, 3)):  # with gaps
+            ComplianceRecord.objects.create(date=base - timedelta(days=d), total_users=100 + d % 7,
+                                            compliant_users=d % 11, non_compliant_users=d % 13)
+        refresh_rollups()
+        ComplianceRecord.objects.filter(date=base).update(compliant_users=50)
+        refresh_rollups(base)  # incremental refresh of the tail
+
+        for day in (base, base - timedelta(days=40), base + timedelta(days=5)):
+            with self.assertNumQueries(2 if day <= base else 3):
+                windows = rolling_compliance(day)
+            for n, got in windows.items():
+                records = ComplianceRecord.objects.filter(date__range=(day - timedelta(days=n - 1), day))
+                self.assertEqual(got, {
+                    "compliant": sum(r.compliant_users for r in records) // n,
+                    "non_compliant": sum(r.non_compliant_users for r in records) // n,
+                    "total_users": max((r.total_users for r in records), default=0),
+                })
+
+
+class ComplianceDumpTests(TestCase):
+    """dumpcompliance -> loadcompliance restores the records and everything derived from them."""
+
+    def test_round_trip_through_a_gzipped_file(self):
+        users = [{"id": i, "email": f"user{i}@example.com"} for i in range(1, 4)]
+        ComplianceRecord.objects.bulk_create([
+            ComplianceRecord(date=date(2025, 4, d), total_users=10, compliant_users=7, non_compliant_users=3,
+                             users=users)
+            for d in range(1, 11)
+        ])
+        path = os.path.join(tempfile.mkdtemp(), "compliance.ndjson.gz")
+        self.addCleanup(os.remove, path)
+        call_command("dumpcompliance", path, stdout=io.StringIO())
+        ComplianceRecord.objects.all().delete()
+
+        call_command("loadcompliance", path, "--batch-days", "3", stdout=io.StringIO())
+        self.assertEqual(ComplianceRecord.objects.count(), 10)
+        self.assertEqual(ComplianceRecord.objects.get(date=date(2025, 4, 5)).users, users)
+        self.assertEqual(NonCompliantDay.objects.count(), 30)
+        self.assertEqual(len(UserData.objects.get(user_id=2).dates), 10)
+        self.assertEqual(rolling_compliance(date(2025, 4, 10), (7,))[7]["compliant"], 7)
+        with gzip.open(path, "rt") as f:
+            self.assertEqual(json.loads(f.readline())["date"], "2025-04-01")
+
+
+class ReconciliationTests(TestCase):
+    """Non-compliant days joined with approved leave into ComplianceDiscrepancy runs."""
+
+    def store_days(self, *days):
+        users = [{"id": i, "email": f"user{i}@example.com"} for i in (5, 6)]
+        store_compliance_days([
+            {"date": date(2025, 3, d), "total_users": 10, "compliant_users": 8, "non_compliant_users": 2,
+             "users": users, "pagination": {}}
+            for d in days
+        ])
+
+    def runs(self, user_id):
+        return list(ComplianceDiscrepancy.objects.filter(user_id=user_id).order_by("start_date").values_list(
+            "kind", "start_date", "end_date", "days"
+        ))
+
+    def test_runs_split_at_approved_leave_and_refresh_incrementally(self):
+        employee = CustomUser.objects.create_user(username="User5@example.com", password="x")
+        leave_type = LeaveType.objects.create(name="Annual", yearly_limit=20)
+        for start, end, status in ((3, 3, "Approved"), (4, 4, "Approved"), (5, 5, "Rejected")):
+            LeaveRequest.objects.create(user=employee, leave_type=leave_type, start_date=date(2025, 3, start),
+                                        end_date=date(2025, 3, end), reason="x", status=status)
+
+        self.store_days(1, 2, 3, 4, 5)
+        self.assertEqual(self.runs(5), [
+            ("unexcused", date(2025, 3, 1), date(2025, 3, 2), 2),
+            ("on_leave", date(2025, 3, 3), date(2025, 3, 4), 2),
+            ("unexcused", date(2025, 3, 5), date(2025, 3, 5), 1),
+        ])
+        self.assertEqual(self.runs(6), [("unexcused", date(2025, 3, 1), date(2025, 3, 5), 5)])
+        self.assertEqual(ComplianceDiscrepancy.objects.get(user_id=5, kind="on_leave").employee, employee)
+        self.assertIsNone(ComplianceDiscrepancy.objects.filter(user_id=6).first().employee)
+
+        # a newly synced day extends the open run; a gap starts a new one
+        self.store_days(6, 8)
+        incremental = self.runs(5)
+        self.assertEqual(incremental[-2:], [
+            ("unexcused", date(2025, 3, 5), date(2025, 3, 6), 2),
+            ("unexcused", date(2025, 3, 8), date(2025, 3, 8), 1),
+        ])
+        reconcile_compliance()
+        self.assertEqual(self.runs(5), incremental)
+
+
+class UpstreamGuardTests(TestCase):
+    """Upstream APIs are only called from background refreshes, behind a circuit breaker."""
+
+    def setUp(self):
+        cache.clear()
+        # run "background" work inline so the tests can observe it
+        patcher = mock.patch("myapp.upstream.submit", side_effect=lambda fn, *args: fn(*args))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_breaker_opens_after_repeated_failures(self):
+        breaker = CircuitBreaker("test", failure_threshold=2, reset_seconds=60)
+        failing = mock.Mock(side_effect=ConnectionError)
+        for _ in range(2):
+            with self.assertRaises(ConnectionError):
+                breaker.call(failing)
+        with self.assertRaises(CircuitOpen):
+            breaker.call(failing)
+        self.assertEqual(failing.call_count, 2)
+
+    def test_stale_value_is_served_while_refreshing(self):
+        loader = mock.Mock(side_effect=["first", "second"])
+        self.assertEqual(stale_while_revalidate("k", loader, fresh_seconds=60, max_age=600, default="none"), "none")
+        self.assertEqual(stale_while_revalidate("k", loader, fresh_seconds=60, max_age=600), "first")
+        self.assertEqual(loader.call_count, 1)
+
+        with mock.patch("myapp.upstream.time.time", return_value=time.time() + 120):
+            self.assertEqual(stale_while_revalidate("k", loader, fresh_seconds=60, max_age=600), "first")
+        self.assertEqual(stale_while_revalidate("k", loader, fresh_seconds=60, max_age=600), "second")
 
-# Create your tests here.
+    def test_missing_compliance_day_is_not_fetched_inside_the_request(self):
+        hr = CustomUser.objects.create_user(username="hr", password="x", role="hr")
+        self.client.force_login(hr)
+        with mock.patch("myapp.upstream.submit") as submit, mock.patch("requests.Session.get") as get:
+            response = self.client.get(reverse("spark_finch_users"), {"date": "2025-02-03"})
+        self.assertEqual(response.status_code, 200)
+        submit.assert_called_once()
+        get.assert_not_called()
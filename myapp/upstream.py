@@ -0,0 +1,122 @@
+#upstream.py
+"""
+Keeping external API calls off the request path.
+
+Views never wait on an upstream API. They read the cached (or DB) value
+and, when it is missing or stale, schedule a refresh on a small thread
+pool (stale_while_revalidate / refresh_in_background). At most one
+refresh per key runs at a time.
+
+Refreshes go through a CircuitBreaker: after `failure_threshold`
+consecutive failures the upstream is left alone for `reset_seconds`, then
+a single trial call decides whether it closes again. Breaker state lives
+in the Django cache.
+"""
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.cache import cache
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+UPSTREAM_TIMEOUT = (3, 5)  # connect, read: for single calls made on behalf of a page
+REFRESH_WORKERS = 2
+REFRESH_LOCK_SECONDS = 300
+
+_executor = ThreadPoolExecutor(max_workers=REFRESH_WORKERS, thread_name_prefix="upstream-refresh")
+
+
+class CircuitOpen(Exception):
+    """The upstream failed repeatedly; calls are skipped until the breaker resets."""
+
+
+class CircuitBreaker:
+    def __init__(self, name, failure_threshold=5, reset_seconds=60):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._failures_key = f"myapp:breaker:{name}:failures"
+        self._open_key = f"myapp:breaker:{name}:open"
+
+    def is_open(self):
+        return cache.get(self._open_key) is not None
+
+    def record_success(self):
+        cache.delete_many([self._failures_key, self._open_key])
+
+    def record_failure(self):
+        # failures outlive the open window, so a failed trial call reopens straight away
+        cache.add(self._failures_key, 0, self.reset_seconds * 10)
+        failures = cache.incr(self._failures_key)
+        if failures >= self.failure_threshold:
+            cache.set(self._open_key, time.time(), self.reset_seconds)
+            logger.warning("Circuit %s open after %d failures", self.name, failures)
+
+    def call(self, fn, *args, **kwargs):
+        if self.is_open():
+            raise CircuitOpen(self.name)
+        try:
+            result = fn(*args, **kwargs)
+        except Exception:
+            self.record_failure()
+            raise
+        self.record_success()
+        return result
+
+
+def submit(fn, *args):
+    """Run fn(*args) on the refresh pool."""
+    return _executor.submit(_run, fn, args)
+
+
+def _run(fn, args):
+    try:
+        fn(*args)
+    except CircuitOpen as e:
+        logger.info("Skipped refresh, circuit %s is open", e)
+    except Exception:
+        logger.exception("Background refresh failed")
+    finally:
+        close_old_connections()
+
+
+def refresh_in_background(key, fn, *args):
+    """
+    Schedule fn(*args) unless a refresh for `key` is already running.
+    Returns True if scheduled.
+    """
+    lock = f"myapp:refreshing:{key}"
+    if not cache.add(lock, True, REFRESH_LOCK_SECONDS):
+        return False
+
+    def job():
+        try:
+            fn(*args)
+        finally:
+            cache.delete(lock)
+
+    submit(job)
+    return True
+
+
+def _reload(key, loader, max_age):
+    cache.set(f"myapp:swr:{key}", {"value": loader(), "at": time.time()}, max_age)
+
+
+def stale_while_revalidate(key, loader, fresh_seconds, max_age, default=None):
+    """
+    The cached value of loader() for `key`, or `default` before the first
+    load. Older than fresh_seconds (or missing) schedules a background
+    reload; entries are dropped after max_age.
+    """
+    entry = cache.get(f"myapp:swr:{key}")
+    if entry is None or time.time() - entry["at"] >= fresh_seconds:
+        refresh_in_background(key, _reload, key, loader, max_age)
+    return entry["value"] if entry is not None else default
+
+
+# One breaker per upstream host
+compliance_api = CircuitBreaker("non-compliance-api")
+ai_manager_api = CircuitBreaker("ai-manager-api")
@@ -17,6 +17,7 @@ urlpatterns = [
     path("admin_page/review-leave/<int:leave_id>/", views.review_leave_request, name="review_leave_request"),
     path("admin_page/review-leave/<int:leave_id>/approve/", views.approve_leave, name="approve_leave"),
     path("admin_page/review-leave/<int:leave_id>/reject/", views.reject_leave, name="reject_leave"),
+    path("admin_page/review-leave/bulk/", views.bulk_review_leaves, name="bulk_review_leaves"),
     path("admin_page/define-leave/", views.define_leave, name="define_leave"),
     path("admin_page/set-limits/", views.set_leave_limits, name="set_limits"),
     path("admin_page/reports/", views.leave_reports, name="view_reports"),
@@ -33,12 +34,16 @@ urlpatterns = [
     path('manager/review-leave/<int:leave_id>/', views.manager_leave_request_detail, name='manager_leave_request_detail'),
     path("manager/review-leave/<int:leave_id>/approve/", views.manager_approve_leave, name="manager_approve_leave"),
     path("manager/review-leave/<int:leave_id>/reject/", views.manager_reject_leave, name="manager_reject_leave"),
+    path("manager/review-leave/bulk/", views.manager_bulk_review_leaves, name="manager_bulk_review_leaves"),
     path('manager/apply/', views.manager_apply_leave, name='manager_apply_leave'),
     path('manager/requests/', views.manager_view_requests, name='manager_view_requests'),
     path('manager/reports/', views.manager_reports, name='manager_reports'),
     path('manager/balance/', views.manager_leave_balance, name='manager_leave_balance'),
+    path('manager/coverage/', views.manager_team_coverage, name='manager_team_coverage'),
 
     path('Notify/<int:leave_id>', views.notify_team_leads, name='notify_team_leads'),
+    path("notifications/stream/", views.notification_stream, name="notification_stream"),
+    path("notifications/ack/", views.acknowledge_notifications, name="acknowledge_notifications"),
     path("chat/", views.chat_bot, name="chat"),
 
 ]
@@ -1,48 +1,48 @@
 #utils.py
 from .models import LeaveBalance, LeaveRequest
+from .work_calendar import working_days_many
 import json
-import requests
-from datetime import datetime, timedelta
-from myapp.models import ComplianceRecord
 from django.db import transaction
 import os
 
 def calculate_leave_balance(user, leave_type):
     """
-    Returns a dictionary with total, used, and remaining leave balance
-    for a given user and leave type.
+    Rebuilds the ledger row for a user and leave type from approved and
+    pending leaves and returns a dictionary with total, used, pending,
+    and remaining leave balance.
+    Only used for backfills/repairs; views read through myapp.ledger.
     """
-    # Get or create balance for this leave type
-    balance_obj, _ = LeaveBalance.objects.get_or_create(
-        user=user,
-        leave_type=leave_type,
-        defaults={"total": leave_type.yearly_limit, "used": 0, "remaining": leave_type.yearly_limit}
-    )
-
-    # Get approved leaves for this type
-    approved_leaves = LeaveRequest.objects.filter(
-        user=user,
-        leave_type=leave_type,
-        status='Approved'
-    )
-
-    # Total used days
-    used = sum(
-        (leave.end_date - leave.start_date).days + 1
-        for leave in approved_leaves
-    )
-
-    # Remaining balance
-    remaining = max(balance_obj.total - used, 0)
-
-    # ✅ Save back to DB so it persists
-    balance_obj.used = used
-    balance_obj.remaining = remaining
-    balance_obj.save()
+    with transaction.atomic():
+        # Get or create balance for this leave type
+        balance_obj, _ = LeaveBalance.objects.select_for_update().get_or_create(
+            user=user,
+            leave_type=leave_type,
+            defaults={"total": leave_type.yearly_limit, "used": 0, "pending": 0, "remaining": leave_type.yearly_limit}
+        )
+
+        leaves = list(LeaveRequest.objects.filter(
+            user=user, leave_type=leave_type, status__in=["Approved", "Pending"]
+        ).values_list("status", "start_date", "end_date", "days"))
+
+        # Total used / reserved (working) days: the counts posted with each leave,
+        # counted now only for leaves that never stored one
+        uncounted = iter(working_days_many([(start, end) for _, start, end, days in leaves if days is None]))
+        held = [(status, days if days is not None else next(uncounted)) for status, _, _, days in leaves]
+        used = sum(days for status, days in held if status == 'Approved')
+        pending = sum(days for status, days in held if status == 'Pending')
+
+        # Remaining balance
+        remaining = max(balance_obj.total - used, 0)
+
+        balance_obj.used = used
+        balance_obj.pending = pending
+        balance_obj.remaining = remaining
+        balance_obj.save(update_fields=["used", "pending", "remaining"])
 
     return {
         "total": balance_obj.total,
         "used": used,
+        "pending": pending,
         "remaining": remaining,
     }
 
@@ -57,40 +57,9 @@ def get_project_manager(user, project):
 
 
 def fetch_and_store_compliance(start_date: str, end_date: str):
-    key = os.environ.get("SPARK_FINCH_KEY")
-    url = "https://aimanager.techjays.com/app/api/non-compliance/users/jaysone"
-
-    start = datetime.strptime(start_date, "%Y-%m-%d").date()
-    end = datetime.strptime(end_date, "%Y-%m-%d").date()
-    delta = (end - start).days + 1
-
-    for i in range(delta):
-        day = start + timedelta(days=i)
-        users = []
-        page = 1
-        while True:
-            params = {"date": day.strftime("%Y-%m-%d"), "page": page, "page_size": 1000}
-            r = requests.get(url, headers={"token": key}, params=params)
-            if r.status_code != 200:
-                break
-            data = r.json()
-            users.extend(data.get("users", []))
-            pagination = data.get("pagination", {})
-            if not pagination.get("has_next", False):
-                break
-            page += 1
-
-        with transaction.atomic():
-            ComplianceRecord.objects.update_or_create(
-                date=day,
-                defaults={
-                    "total_users": data.get("total_users", 0),
-                    "compliant_users": data.get("compliant_users", 0),
-                    "non_compliant_users": data.get("non_compliant_users", 0),
-                    "users": users,
-                    "pagination": pagination
-                }
-            )
+    """Fetch and store compliance data for every day in the range (see myapp.compliance)."""
+    from .compliance import sync_compliance
+    return sync_compliance(start_date, end_date)
 
 
 import google.generativeai as genai
@@ -4,16 +4,32 @@ from datetime import datetime
 from django.contrib.auth import authenticate, login, get_user_model, logout
 from django.contrib.auth.decorators import login_required
 from django.core.serializers.json import DjangoJSONEncoder
-from django.http import HttpResponseForbidden, JsonResponse
+from django.http import HttpResponseForbidden, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.core.exceptions import ValidationError
 from django.views.decorators.cache import never_cache
 import json
 import requests
+from asgiref.sync import sync_to_async
 from datetime import date, timedelta, datetime
 from .models import LeaveType, LeaveRequest, LeaveBalance, CustomUser, Project, ProjectMember, Notification, UserData, \
     ChatHistory
-from .utils import calculate_leave_balance, chat_with_ai
+from .utils import chat_with_ai
+from .work_calendar import get_calendar, merge_date_ranges, dates_to_ranges, date_ranges_json
+from .query_budget import query_budget
+from .pagination import keyset_page, keyset_json, wants_json, leave_request_json, user_json
+from .availability import COVERAGE_MAX_DAYS, project_absence_series, team_absence_context
+from .hierarchy import can_review, skip_level_reports
+from .compliance import refresh_day, rolling_compliance
+from .upstream import ai_manager_api, compliance_api, refresh_in_background, stale_while_revalidate, \
+    UPSTREAM_TIMEOUT
+from .notifications import DASHBOARD_NOTIFICATIONS, acknowledge, notification_events, notify_leads_of_request, \
+    notify_leave_reviewed, unread_count
+from .ledger import get_leave_balances, set_leave_status, sync_leave_type_limit, build_balance_report, \
+    submit_leave, bulk_set_leave_status
 from dotenv import load_dotenv
 import os
 
@@ -26,11 +42,13 @@ User = get_user_model()  # Use CustomUser throughout
 
 # ---------------- AUTH / DASHBOARD ---------------- #
 
+@query_budget(queries=5)
 @login_required
 def logout_view(request):
     logout(request)
     return redirect("login")
 
+@query_budget(queries=2)
 @never_cache
 def login_view(request):
     if request.method == "POST":
@@ -59,11 +77,13 @@ def login_view(request):
 # ---------------- LEAVE APPLICATION ---------------- #
 
 
+@query_budget(queries=3)
 @login_required
 def user_dashboard(request):
     return render(request, "myapp/user_dashboard.html")
 
 
+@query_budget(queries=14)
 @login_required
 def apply_leave(request):
     leave_types = LeaveType.objects.all()
@@ -76,111 +96,103 @@ def apply_leave(request):
 
         leave_type = get_object_or_404(LeaveType, id=leave_type_id)
 
-        leave_balance = calculate_leave_balance(request.user, leave_type)
-        remaining_days = leave_balance['remaining']
-
-        requested_days = (datetime.strptime(end_date, "%Y-%m-%d") -
-                          datetime.strptime(start_date, "%Y-%m-%d")).days + 1
-
-        if remaining_days <= 0:
-            messages.error(request, f"You have no remaining {leave_type.name} leave.")
-            return redirect('apply_leave')
-        elif requested_days > remaining_days:
-            messages.error(request, f"You only have {remaining_days} days left for {leave_type.name} leave.")
+        try:
+            submit_leave(
+                request.user,
+                leave_type,
+                datetime.strptime(start_date, "%Y-%m-%d").date(),
+                datetime.strptime(end_date, "%Y-%m-%d").date(),
+                reason,
+            )
+        except ValidationError as e:
+            messages.error(request, e.message)
             return redirect('apply_leave')
-
-        LeaveRequest.objects.create(
-            user=request.user,
-            leave_type=leave_type,
-            start_date=start_date,
-            end_date=end_date,
-            reason=reason,
-            status='Pending'
-        )
         messages.success(request, "Leave request submitted.")
 
     return render(request, "myapp/apply_leave.html", {"leave_types": leave_types})
 
 
+@query_budget(queries=4)
 @login_required
 def view_requests(request):
-    requests = LeaveRequest.objects.filter(user=request.user).order_by('-applied_at')
-    return render(request, "myapp/view_requests.html", {"requests": requests})
+    requests = LeaveRequest.objects.filter(user=request.user).select_related("user", "leave_type", "reviewed_by")
+    page = keyset_page(request, requests, ("-applied_at", "-id"))
+    if wants_json(request):
+        return keyset_json(page, leave_request_json)
+    return render(request, "myapp/view_requests.html", {"requests": page["items"], "page": page})
+
+
+REPORTED_DAY_URL = "https://ai-manager-6132686303.us-central1.run.app/app/api/non-compliance/users/jaysone"
+REPORTED_DAY_FRESH = 300
+REPORTED_DAY_MAX_AGE = 24 * 60 * 60
+
 
+def fetch_reported_day():
+    """The day the non-compliance API reports and the emails listed on it."""
+    params = {"date": "2025-01-17", "page": 1, "page_size": 5}
+    response = requests.get(REPORTED_DAY_URL, headers={"token": key}, params=params, timeout=UPSTREAM_TIMEOUT)
+    response.raise_for_status()
+    data = response.json()
+    return {"date": data.get("date"), "emails": [item.get("email") for item in data.get("users", [])]}
 
+
+def load_reported_day():
+    return ai_manager_api.call(fetch_reported_day)
+
+
+@query_budget(queries=6)
 @login_required
 def view_balance(request):
     # Leave balances
-    leave_types = LeaveType.objects.all()
-    balances = {lt.name: calculate_leave_balance(request.user, lt) for lt in leave_types}
-
-    leave_dates = []
+    leave_types = list(LeaveType.objects.all())
+    balances = get_leave_balances(request.user, leave_types)
 
-    # 1. Local DB leaves
-    leaves = LeaveRequest.objects.filter(user=request.user, status="Approved")
-    for leave in leaves:
-        day = leave.start_date
-        while day <= leave.end_date:
-            leave_dates.append(str(day))
-            day += timedelta(days=1)
+    # 1. Local DB leaves, as (start, end) ranges
+    leave_ranges = list(LeaveRequest.objects.filter(
+        user=request.user, status="Approved"
+    ).values_list("start_date", "end_date"))
 
-    # 2. External API
-    try:
-        url = "https://ai-manager-6132686303.us-central1.run.app/app/api/non-compliance/users/jaysone"
-        headers = {"token": key}  # replace VALUE with actual
-        params = {"date": "2025-01-17", "page": 1, "page_size": 5}
-
-        response = requests.get(url, headers=headers, params=params)
-        if response.status_code == 200:
-            data = response.json()
-
-            # date from API (string)
-            date_str = data.get("date")  # e.g., "2025-09-16"
-            date_obj = datetime.strptime(date_str, "%Y-%m-%d")
-
-            days_counted = 0
-            current_date = date_obj
-
-            while days_counted < 7:
-                current_date -= timedelta(days=1)
-                # skip Saturday (5) and Sunday (6)
-                if current_date.weekday() < 5:
-                    days_counted += 1
-
-            date_ = current_date
-            # extract emails + date
-            for item in data.get("users", []):
-                email = item.get("email")
-                if email == request.user.username:  # match with logged in user
-                    leave_dates.append(date_.strftime("%Y-%m-%d"))  # << convert to string
-    except Exception as e:
-        print("API fetch failed:", e)
+    # 2. External API, served from cache and refreshed in the background
+    reported = stale_while_revalidate(
+        "view_balance:reported_day", load_reported_day, fresh_seconds=REPORTED_DAY_FRESH, max_age=REPORTED_DAY_MAX_AGE
+    )
+    if reported and reported["date"] and request.user.username in reported["emails"]:
+        try:
+            date_obj = datetime.strptime(reported["date"], "%Y-%m-%d").date()
+        except ValueError:
+            date_obj = None
+        if date_obj:
+            # 7 working days back (skips weekends and holidays)
+            date_ = get_calendar().shift(date_obj, -7)
+            leave_ranges.append((date_, date_))
 
     return render(request, "myapp/view_balance.html", {
         "balances": balances,
-        "leave_dates_json": json.dumps(leave_dates),
+        "leave_ranges_json": date_ranges_json(merge_date_ranges(leave_ranges)),
     })
 
 
 # ---------------- HR VIEWS ---------------- #
 
+@query_budget(queries=4)
 @login_required
 def pending_requests(request):
-    requests = LeaveRequest.objects.filter(status='Pending').order_by('-applied_at')
-    return render(request, "myapp/admin_page.html", {"requests": requests})
+    requests = LeaveRequest.objects.filter(status='Pending').select_related("user", "leave_type", "reviewed_by")
+    page = keyset_page(request, requests, ("-applied_at", "-id"))
+    if wants_json(request):
+        return keyset_json(page, leave_request_json)
+    return render(request, "myapp/admin_page.html", {"requests": page["items"], "page": page})
 
 
+@query_budget(queries=22)
 @login_required
 def approve_leave(request, leave_id):
     leave = get_object_or_404(LeaveRequest, id=leave_id)
 
     if request.method == "POST":
         review_reason = request.POST.get("reason", "")
-        leave.status = "Approved"
-        leave.reviewed_by = request.user
-        leave.review_reason = review_reason
-        leave.save()
-        calculate_leave_balance(leave.user, leave.leave_type)
+        set_leave_status(leave, "Approved", reviewed_by=request.user, review_reason=review_reason)
+        notify_leave_reviewed([leave], request.user)
         messages.success(request, f"{leave.user.username}'s leave approved.")
         return redirect("dashboard")
 
@@ -191,16 +203,15 @@ def approve_leave(request, leave_id):
     })
 
 
+@query_budget(queries=16)
 @login_required
 def reject_leave(request, leave_id):
     leave = get_object_or_404(LeaveRequest, id=leave_id)
 
     if request.method == "POST":
         review_reason = request.POST.get("reason", "")
-        leave.status = "Rejected"
-        leave.reviewed_by = request.user
-        leave.review_reason = review_reason
-        leave.save()
+        set_leave_status(leave, "Rejected", reviewed_by=request.user, review_reason=review_reason)
+        notify_leave_reviewed([leave], request.user)
         messages.info(request, f"{leave.user.username}'s leave rejected.")
         return redirect("dashboard")
 
@@ -212,33 +223,98 @@ def reject_leave(request, leave_id):
 
 
 
+def handle_bulk_review(request, leaves):
+    """
+    POST JSON {"leave_ids": [...], "action": "approve" | "reject", "reason": "..."}.
+    Returns per-item results: {"results": [{"id": 1, "ok": true, "status": "Approved"}, ...]}.
+    """
+    if request.method != "POST":
+        return JsonResponse({"error": "POST required"}, status=405)
+
+    try:
+        data = json.loads(request.body or "{}")
+    except ValueError:
+        return JsonResponse({"error": "Body must be JSON"}, status=400)
+    if not isinstance(data, dict):
+        return JsonResponse({"error": "Body must be a JSON object"}, status=400)
+    action = data.get("action")
+    if action not in ("approve", "reject"):
+        return JsonResponse({"error": "action must be 'approve' or 'reject'"}, status=400)
+    leave_ids = data.get("leave_ids", [])
+    if not isinstance(leave_ids, list) or not all(isinstance(i, int) and not isinstance(i, bool) for i in leave_ids):
+        return JsonResponse({"error": "leave_ids must be a list of ids"}, status=400)
+    reason = data.get("reason", "")
+    if not isinstance(reason, str):
+        return JsonResponse({"error": "reason must be a string"}, status=400)
+
+    status = "Approved" if action == "approve" else "Rejected"
+    results = bulk_set_leave_status(leaves, leave_ids, status, request.user, reason)
+    notify_leave_reviewed(
+        LeaveRequest.objects.filter(id__in=[i for i, r in results.items() if r == status]), request.user
+    )
+    return JsonResponse({"results": [
+        {"id": leave_id, "ok": result == status, "status": result}
+        for leave_id, result in results.items()
+    ]})
+
+
+@query_budget(queries=21)
+@login_required
+def bulk_review_leaves(request):
+    if not (request.user.is_superuser or request.user.role == "hr"):
+        return JsonResponse({"error": "Not authorized"}, status=403)
+    return handle_bulk_review(request, LeaveRequest.objects.all())
+
+
+@query_budget(queries=3)
 @login_required
 def define_leave(request):
     if request.method == "POST":
         name = request.POST.get("name")
         yearly_limit = request.POST.get("yearly_limit")
 
-        if name and yearly_limit:
-            LeaveType.objects.update_or_create(
+        try:
+            yearly_limit = int(yearly_limit)
+        except (TypeError, ValueError):
+            yearly_limit = None
+        if not name or yearly_limit is None or yearly_limit < 0:
+            messages.error(request, "Enter a leave type name and a yearly limit of 0 or more days.")
+            return render(request, "myapp/define_leave.html", {"leave_types": LeaveType.objects.all()}, status=400)
+
+        # the limit and every balance of the type change together
+        with transaction.atomic():
+            leave_type, _ = LeaveType.objects.update_or_create(
                 name=name,
                 defaults={"yearly_limit": yearly_limit}
             )
-            return redirect("define_leave")
+            sync_leave_type_limit(leave_type)
+        return redirect("define_leave")
 
     leave_types = LeaveType.objects.all()
     return render(request, "myapp/define_leave.html", {"leave_types": leave_types})
 
 
+@query_budget(queries=4)
 @login_required
 def set_leave_limits(request):
     leave_types = LeaveType.objects.all()
 
     if request.method == "POST":
-        for lt in leave_types:
-            new_limit = request.POST.get(f"limit_{lt.id}")
-            if new_limit is not None:
-                lt.yearly_limit = int(new_limit)
+        try:
+            limits = {
+                lt: int(request.POST[f"limit_{lt.id}"])
+                for lt in leave_types if f"limit_{lt.id}" in request.POST
+            }
+        except ValueError:
+            limits = None
+        if limits is None or any(limit < 0 for limit in limits.values()):
+            messages.error(request, "Yearly limits must be whole numbers of 0 or more days.")
+            return redirect("set_limits")
+        with transaction.atomic():
+            for lt, limit in limits.items():
+                lt.yearly_limit = limit
                 lt.save()
+                sync_leave_type_limit(lt)
         return redirect("set_limits")
 
     return render(request, "myapp/set_limits.html", {"leaves": leave_types})
@@ -247,44 +323,64 @@ def set_leave_limits(request):
 # Level 1: Show links for Managers and Employees
 
 
-from .models import ComplianceRecord
-from .utils import fetch_and_store_compliance
-from django.core.paginator import Paginator
+from .models import ComplianceDiscrepancy, ComplianceRecord, NonCompliantDay
 
+@query_budget(queries=3)
 @login_required
 def leave_reports(request):
     return render(request, "myapp/view_reports.html")
 
 #Non compliance users list
+@query_budget(queries=2)
 def user_list(request):
-    users = UserData.objects.all().order_by('email')
-    return render(request, 'myapp/user_non_compliance_list.html', {'users': users})
+    users = UserData.objects.defer("dates")
+    page = keyset_page(request, users, ("email", "id"))
+    if wants_json(request):
+        return keyset_json(page, lambda u: {"user_id": u.user_id, "email": u.email})
+    return render(request, 'myapp/user_non_compliance_list.html', {'users': page["items"], "page": page})
 
 #Non compliance users detail
+@query_budget(queries=3)
 def user_detail(request, user_id):
-    user = get_object_or_404(UserData, user_id=user_id)
-    leave_dates_json = json.dumps(user.dates)
-    return render(request, 'myapp/user_non_compliance_detail.html', {'user': user,"leave_dates_json": leave_dates_json})
+    user = get_object_or_404(UserData.objects.defer("dates"), user_id=user_id)
+    days = NonCompliantDay.objects.filter(user=user).order_by("date").values_list("date", flat=True)
+    leave_ranges_json = date_ranges_json(dates_to_ranges(days))
+    # 🔹 Non-compliant runs split by approved leave (see myapp.reconciliation)
+    discrepancies = ComplianceDiscrepancy.objects.filter(user=user).order_by("-start_date")
+    return render(request, 'myapp/user_non_compliance_detail.html', {
+        'user': user, "leave_ranges_json": leave_ranges_json, "discrepancies": discrepancies,
+    })
 
 
 # Level 2: Show list of users by role
+@query_budget(queries=6)
 @login_required
 def list_users(request, role):
     if role not in ["manager", "employee"]:
         return render(request, "myapp/view_reports.html")  # fallback if invalid role
 
-    users = CustomUser.objects.filter(is_superuser=False, role=role)
-    return render(request, "myapp/list_users.html", {"users": users, "role": role})
+    users = CustomUser.objects.filter(is_superuser=False, role=role).select_related("manager")
+    page = keyset_page(request, users, ("username", "id"))
+    if wants_json(request):
+        return keyset_json(page, user_json)
+    leave_types = list(LeaveType.objects.all())
+    return render(request, "myapp/list_users.html", {
+        "report": build_balance_report(page["items"], leave_types),
+        "leave_types": leave_types,
+        "role": role,
+        "page": page,
+    })
 
 # Level 3: Show detailed leave report for a single user
+@query_budget(queries=6)
 @login_required
 def user_report(request, user_id):
     user = get_object_or_404(CustomUser, id=user_id, is_superuser=False)
-    leave_types = LeaveType.objects.all()
+    leave_types = list(LeaveType.objects.all())
 
     report = {
         "employee": user,
-        "balances": {lt.name: calculate_leave_balance(user, lt) for lt in leave_types},
+        "balances": get_leave_balances(user, leave_types),
     }
 
     return render(request, "myapp/user_report.html", {"report": report})
@@ -293,6 +389,7 @@ def user_report(request, user_id):
 
 # ---------------- MANAGER VIEWS ---------------- #
 
+@query_budget(queries=5)
 @login_required
 def manager_dashboard(request):
     # Existing pending requests
@@ -303,18 +400,31 @@ def manager_dashboard(request):
     pending_requests = LeaveRequest.objects.filter(
         status="Pending",
         user__in=employees_under_manager
-    ).order_by("-applied_at")
+    ).select_related("user", "leave_type", "reviewed_by")
+    page = keyset_page(request, pending_requests, ("-applied_at", "-id"))
+    if wants_json(request):
+        return keyset_json(page, leave_request_json)
 
     # Notifications
-    notifications = request.user.notifications.filter(is_read=False).order_by("-created_at")
-    notifications_list = list(notifications)
-    # Mark all notifications as read (or delete if you prefer)
-    notifications.update(is_read=True)  # OR notifications.delete() to remove completely
+    # is_read__in=[False] rather than is_read=False: the latter compiles to "NOT is_read",
+    # which can't use notif_recipient_unread_idx
+    # Read state is acknowledged from the page (acknowledge_notifications), not on load;
+    # new ones arrive over notification_stream. Only the latest few are rendered, the
+    # badge shows the counter.
+    unread = unread_count(request.user.id)
+    notifications_list = list(
+        request.user.notifications.filter(is_read__in=[False]).order_by("-created_at")[:DASHBOARD_NOTIFICATIONS]
+    ) if unread else []
     return render(request, "myapp/manager_dashboard.html", {
-        "pending_requests": pending_requests,
-        "notifications": notifications_list
+        "pending_requests": page["items"],
+        "page": page,
+        "notifications": notifications_list,
+        "notifications_limit": DASHBOARD_NOTIFICATIONS,
+        "unread_count": unread,
+        "last_notification_id": max((n.id for n in notifications_list), default=0),
     })
 
+@query_budget(queries=13)
 @login_required
 def manager_apply_leave(request):
     leave_types = LeaveType.objects.all()
@@ -326,56 +436,48 @@ def manager_apply_leave(request):
         reason = request.POST['reason']
 
         leave_type = get_object_or_404(LeaveType, id=leave_type_id)
-        leave_balance = calculate_leave_balance(request.user, leave_type)
-        remaining_days = leave_balance['remaining']
-
-        requested_days = (datetime.strptime(end_date, "%Y-%m-%d") -
-                          datetime.strptime(start_date, "%Y-%m-%d")).days + 1
 
-        if remaining_days <= 0:
-            messages.error(request, f"You have no remaining {leave_type.name} leave.")
-            return redirect('manager_apply_leave')
-        elif requested_days > remaining_days:
-            messages.error(request, f"You only have {remaining_days} days left for {leave_type.name} leave.")
+        try:
+            submit_leave(
+                request.user,
+                leave_type,
+                datetime.strptime(start_date, "%Y-%m-%d").date(),
+                datetime.strptime(end_date, "%Y-%m-%d").date(),
+                reason,
+            )
+        except ValidationError as e:
+            messages.error(request, e.message)
             return redirect('manager_apply_leave')
-
-        LeaveRequest.objects.create(
-            user=request.user,
-            leave_type=leave_type,
-            start_date=start_date,
-            end_date=end_date,
-            reason=reason,
-            status='Pending'
-        )
         messages.success(request, "Leave request submitted.")
         return redirect('manager_dashboard')
 
     return render(request, "myapp/manager_apply_leave.html", {"leave_types": leave_types})
 
 
+@query_budget(queries=4)
 @login_required
 def manager_view_requests(request):
-    leave_requests = LeaveRequest.objects.filter(user=request.user).order_by('-applied_at')
-    return render(request, "myapp/manager_view_requests.html", {"leave_requests": leave_requests})
+    leave_requests = LeaveRequest.objects.filter(user=request.user).select_related("user", "leave_type", "reviewed_by")
+    page = keyset_page(request, leave_requests, ("-applied_at", "-id"))
+    if wants_json(request):
+        return keyset_json(page, leave_request_json)
+    return render(request, "myapp/manager_view_requests.html", {"leave_requests": page["items"], "page": page})
 
 
+@query_budget(queries=22)
 @login_required
 def manager_approve_leave(request, leave_id):
     leave = get_object_or_404(LeaveRequest, id=leave_id, status="Pending")
 
     # check authorization
-    is_authorized = leave.user.manager == request.user or ProjectMember.objects.filter(user=leave.user, project__lead=request.user).exists()
-    if not is_authorized:
+    if not can_review(request.user, leave.user_id):
         messages.error(request, "You are not authorized to approve this request.")
         return redirect("manager_dashboard")
 
     if request.method == "POST":
         review_reason = request.POST.get("reason", "")
-        leave.status = "Approved"
-        leave.reviewed_by = request.user
-        leave.review_reason = review_reason
-        leave.save()
-        calculate_leave_balance(leave.user, leave.leave_type)
+        set_leave_status(leave, "Approved", reviewed_by=request.user, review_reason=review_reason)
+        notify_leave_reviewed([leave], request.user)
         messages.success(request, f"Leave approved for {leave.user.username}.")
         return redirect("manager_dashboard")
 
@@ -386,21 +488,19 @@ def manager_approve_leave(request, leave_id):
     })
 
 
+@query_budget(queries=16)
 @login_required
 def manager_reject_leave(request, leave_id):
     leave = get_object_or_404(LeaveRequest, id=leave_id, status="Pending")
 
-    is_authorized = leave.user.manager == request.user or ProjectMember.objects.filter(user=leave.user, project__lead=request.user).exists()
-    if not is_authorized:
+    if not can_review(request.user, leave.user_id):
         messages.error(request, "You are not authorized to reject this request.")
         return redirect("manager_dashboard")
 
     if request.method == "POST":
         review_reason = request.POST.get("reason", "")
-        leave.status = "Rejected"
-        leave.reviewed_by = request.user
-        leave.review_reason = review_reason
-        leave.save()
+        set_leave_status(leave, "Rejected", reviewed_by=request.user, review_reason=review_reason)
+        notify_leave_reviewed([leave], request.user)
         messages.info(request, f"Leave rejected for {leave.user.username}.")
         return redirect("manager_dashboard")
 
@@ -410,62 +510,95 @@ def manager_reject_leave(request, leave_id):
     })
 
 
+def manager_reviewable_leaves(manager):
+    """Leaves of the manager's direct reports and of members of projects they lead."""
+    return LeaveRequest.objects.filter(
+        Q(user__manager=manager) | Q(user__projectmember__project__lead=manager)
+    )
+
+
+@query_budget(queries=21)
+@login_required
+def manager_bulk_review_leaves(request):
+    if request.user.role != "manager":
+        return JsonResponse({"error": "Not authorized"}, status=403)
+    return handle_bulk_review(request, manager_reviewable_leaves(request.user))
+
+
+@query_budget(queries=8)
 @login_required
 def manager_reports(request):
     # Employees directly managed by this manager
     direct_employees = CustomUser.objects.filter(
         manager=request.user, role="employee"
     )
+    # Reports of reports, any depth (closure table)
+    indirect_employees = skip_level_reports(request.user).select_related("manager").order_by("username")
     # Employees from projects where this manager is the lead
     project_employees = CustomUser.objects.filter(
         projectmember__project__lead=request.user
-    )
+    ).distinct()
 
-    leave_types = LeaveType.objects.all()
-    def build_report(employee_queryset):
-        report_list = []
-        for emp in employee_queryset:
-            emp_data = {
-                "employee": emp,
-                "balances": {
-                    lt.name: calculate_leave_balance(emp, lt)
-                    for lt in leave_types
-                },
-            }
-            report_list.append(emp_data)
-        return report_list
+    leave_types = list(LeaveType.objects.all())
 
-    # Prepare two reports
-    direct_reports = build_report(direct_employees)
-    project_reports = build_report(project_employees)
+    # Prepare the reports (one balance query each)
+    direct_reports = build_balance_report(direct_employees, leave_types)
+    skip_level = build_balance_report(indirect_employees, leave_types)
+    project_reports = build_balance_report(project_employees, leave_types)
 
     context = {
         "direct_reports": direct_reports,
+        "skip_level_reports": skip_level,
         "project_reports": project_reports,
     }
     return render(request, "myapp/manager_reports.html", context)
 
+@query_budget(queries=6)
 @login_required
 def manager_leave_balance(request):
     # Leave balances
-    leave_types = LeaveType.objects.all()
-    balances = {lt.name: calculate_leave_balance(request.user, lt) for lt in leave_types}
+    leave_types = list(LeaveType.objects.all())
+    balances = get_leave_balances(request.user, leave_types)
 
-    # Get all approved leave days as strings YYYY-MM-DD
-    leaves = LeaveRequest.objects.filter(user=request.user, status="Approved")
-    leave_dates = []
-    for leave in leaves:
-        day = leave.start_date
-        while day <= leave.end_date:
-            leave_dates.append(str(day))  # only YYYY-MM-DD
-            day += timedelta(days=1)
+    # Approved leave as merged [start, end] ranges
+    leave_ranges = LeaveRequest.objects.filter(
+        user=request.user, status="Approved"
+    ).values_list("start_date", "end_date")
 
     return render(request, "myapp/manager_leave_balance.html", {
         "balances": balances,
-        "leave_dates_json": json.dumps(leave_dates),
+        "leave_ranges_json": date_ranges_json(merge_date_ranges(leave_ranges)),
     })
 
 
+@query_budget(queries=5)
+@login_required
+def manager_team_coverage(request):
+    """Per-day count of members on leave for each project led by this manager (JSON)."""
+    start = request.GET.get("start")
+    end = request.GET.get("end")
+    try:
+        start_date = datetime.strptime(start, "%Y-%m-%d").date() if start else date.today()
+        end_date = datetime.strptime(end, "%Y-%m-%d").date() if end else start_date + timedelta(days=30)
+    except ValueError:
+        return JsonResponse({"error": "start and end must be dates (YYYY-MM-DD)"}, status=400)
+    if end_date < start_date:
+        return JsonResponse({"error": "end must not be before start"}, status=400)
+    if (end_date - start_date).days + 1 > COVERAGE_MAX_DAYS:
+        return JsonResponse({"error": f"At most {COVERAGE_MAX_DAYS} days per request"}, status=400)
+
+    projects = dict(Project.objects.filter(lead=request.user).values_list("id", "name"))
+    series = project_absence_series(list(projects), start_date, end_date)
+    return JsonResponse({
+        "start": start_date,
+        "end": end_date,
+        "projects": [
+            {"id": pid, "name": name, "days": series.get(pid, [])}
+            for pid, name in projects.items()
+        ],
+    }, encoder=DjangoJSONEncoder)
+
+
 # Helper function to get project-specific manager/lead
 def get_project_lead_for_user(user, project):
     """Returns project lead if the user is a member and not the lead"""
@@ -475,6 +608,7 @@ def get_project_lead_for_user(user, project):
 
 
 # 🔹 Manager view: Leave Request Detail
+@query_budget(queries=11)
 @login_required
 def manager_leave_request_detail(request, leave_id):
     from .utils import get_leave_decision_with_ai
@@ -482,15 +616,12 @@ def manager_leave_request_detail(request, leave_id):
     leave = get_object_or_404(LeaveRequest, id=leave_id)
 
     # 🔒 Authorization
-    projects = ProjectMember.objects.filter(user=leave.user).select_related("project")
-    authorized = any(mem.project.lead == request.user for mem in projects)
-    if leave.user.manager == request.user:
-        authorized = True
-
-    if request.user.role != "manager" or not authorized:
+    if request.user.role != "manager" or not can_review(request.user, leave.user_id):
         messages.error(request, "You are not authorized to view this request.")
         return redirect("manager_dashboard")
 
+    projects = ProjectMember.objects.filter(user=leave.user).select_related("project")
+
     # 📊 Leave balances
     balances = LeaveBalance.objects.filter(user=leave.user).select_related("leave_type")
 
@@ -539,6 +670,7 @@ def manager_leave_request_detail(request, leave_id):
 
 
 # 🔹 HR view: Leave Request Review (AI-enhanced)
+@query_budget(queries=12)
 @login_required
 def review_leave_request(request, leave_id):
     from .utils import get_leave_decision_with_ai
@@ -569,7 +701,9 @@ def review_leave_request(request, leave_id):
     )
 
     # Fetch past leaves for this employee (excluding current leave)
-    past_leaves = LeaveRequest.objects.filter(user=leave.user).exclude(id=leave.id).order_by('-applied_at')
+    past_leaves = LeaveRequest.objects.filter(user=leave.user).exclude(id=leave.id).select_related(
+        "leave_type", "reviewed_by"
+    ).order_by('-applied_at')
 
     # Build summary string
     previous_leaves_summary = ""
@@ -615,25 +749,51 @@ def review_leave_request(request, leave_id):
 
 
 
+@query_budget(queries=2)
+@login_required
+async def notification_stream(request):
+    """text/event-stream of the user's unread notifications; see myapp/notifications.py."""
+    user = await request.auser()
+    after = request.headers.get("Last-Event-ID") or request.GET.get("after") or 0
+    try:
+        after = int(after)
+    except ValueError:
+        after = 0
+    response = StreamingHttpResponse(notification_events(user.id, after), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"  # don't let nginx buffer the stream
+    return response
+
+
+@query_budget(queries=7)
+@login_required
+async def acknowledge_notifications(request):
+    """POST JSON {"ids": [...]} or {"up_to": id}; marks those notifications read."""
+    if request.method != "POST":
+        return JsonResponse({"error": "POST required"}, status=405)
+    user = await request.auser()
+    try:
+        data = json.loads(request.body or "{}")
+        if not isinstance(data, dict):
+            raise TypeError("body must be a JSON object")
+        ids = [int(i) for i in data["ids"]] if "ids" in data else None
+        up_to = int(data["up_to"]) if "up_to" in data else None
+    except (TypeError, ValueError):
+        return JsonResponse({"error": "ids must be a list of ids, up_to an id"}, status=400)
+    updated = await acknowledge(user.id, ids=ids, up_to=up_to)
+    return JsonResponse({"acknowledged": updated, "unread": await sync_to_async(unread_count)(user.id)})
+
+
+@query_budget(queries=11)
 @login_required
 def notify_team_leads(request, leave_id):
-    leave = get_object_or_404(LeaveRequest, id=leave_id)
+    leave = get_object_or_404(LeaveRequest.objects.select_related("user"), id=leave_id)
 
     # Check if already notified
     if leave.leads_notified:
         messages.info(request, "All leads have already been notified.")
     else:
-        projects = ProjectMember.objects.filter(user=leave.user).select_related("project")
-        notified = 0
-
-        for member in projects:
-            lead = member.project.lead
-            if lead and lead != leave.user.manager:  # skip if same as employee’s manager
-                Notification.objects.create(
-                    recipient=lead,
-                    message=f"{leave.user.username} has requested leave ({leave.start_date} → {leave.end_date})."
-                )
-                notified += 1
+        notified = len(notify_leads_of_request(leave))
 
         if notified:
             messages.success(request, f"Notified {notified} team lead(s).")
@@ -642,7 +802,7 @@ def notify_team_leads(request, leave_id):
 
         # mark as notified
         leave.leads_notified = True
-        leave.save()
+        leave.save(update_fields=["leads_notified"])
 
     # Redirect back to the appropriate page
     if request.user.role == "hr":
@@ -656,17 +816,32 @@ def notify_team_leads(request, leave_id):
 
 
 # 🔹 1️⃣ View to list all users
+@query_budget(queries=5)
 @login_required
 def mock_user_list(request):
-    employees = CustomUser.objects.filter(role='employee').select_related('manager')
-    managers = CustomUser.objects.filter(role='manager').select_related('manager')
+    employees = keyset_page(request, CustomUser.objects.filter(role='employee').select_related('manager'),
+                            ("username", "id"), param="employees_after")
+    managers = keyset_page(request, CustomUser.objects.filter(role='manager').select_related('manager'),
+                           ("username", "id"), param="managers_after")
+    if wants_json(request):
+        return JsonResponse({
+            name: {
+                "results": [user_json(u) for u in page["items"]],
+                "has_next": page["has_next"],
+                "next_cursor": page["next_cursor"],
+            }
+            for name, page in (("employees", employees), ("managers", managers))
+        })
     return render(request, "myapp/mock_user_list.html", {
-        "employees": employees,
-        "managers": managers,
+        "employees": employees["items"],
+        "managers": managers["items"],
+        "employees_page": employees,
+        "managers_page": managers,
     })
 
 
 # 🔹 2️⃣ View to show details of a specific user
+@query_budget(queries=8)
 @login_required
 def mock_user_detail(request, user_id):
     user = get_object_or_404(CustomUser, id=user_id)
@@ -684,14 +859,12 @@ def mock_user_detail(request, user_id):
     return render(request, "myapp/mock_user_detail.html", context)
 
 
+@query_budget(queries=7)
 @login_required
 def spark_finch_users(request):
     selected_date = request.GET.get("date")
-    page = int(request.GET.get("page", 1))
-    page_size = 20
 
-    users_from_db = []
-    pagination = {}
+    users_page = None
     total_employees = compliant_users = non_compliant_users = 0
 
     week_data = month_data = three_month_data = six_month_data = {}
@@ -699,55 +872,33 @@ def spark_finch_users(request):
     if selected_date:
         base_date = datetime.strptime(selected_date, "%Y-%m-%d").date()
 
-        # Fetch from DB, auto-fetch from API if missing
-        record = ComplianceRecord.objects.filter(date=base_date).first()
+        # Fetch from DB; a missing day is fetched in the background, never inside this request
+        record = ComplianceRecord.objects.filter(date=base_date).defer("users").first()
         if not record:
-            fetch_and_store_compliance(selected_date, selected_date)
-            record = ComplianceRecord.objects.filter(date=base_date).first()
+            refresh_in_background(f"compliance:{base_date}", compliance_api.call, refresh_day, base_date)
+            messages.info(request, f"Fetching compliance data for {selected_date}. Refresh in a moment.")
 
         if record:
-            users_list = record.users or []
             total_employees = record.total_users
             compliant_users = record.compliant_users
             non_compliant_users = record.non_compliant_users
 
-            # Pagination
-            paginator = Paginator(users_list, page_size)
-            page_obj = paginator.get_page(page)
-            users_from_db = [u["email"] for u in page_obj]
-
-            pagination = {
-                "previous_page": page_obj.previous_page_number() if page_obj.has_previous() else None,
-                "next_page": page_obj.next_page_number() if page_obj.has_next() else None,
-                "has_previous": page_obj.has_previous(),
-                "has_next": page_obj.has_next(),
-            }
-
-        # Chart aggregations
-        def fetch_range(days):
-            start = base_date - timedelta(days=days - 1)
-            records = ComplianceRecord.objects.filter(date__range=(start, base_date))
-            total_compliant = sum(r.compliant_users for r in records)
-            total_non_compliant = sum(r.non_compliant_users for r in records)
-            total_users_agg = max((r.total_users for r in records), default=0)
-            return {
-                "compliant": total_compliant // days if days else 0,
-                "non_compliant": total_non_compliant // days if days else 0,
-                "total_users": total_users_agg,
-            }
+            # Users of the day, paged in the DB
+            users_page = keyset_page(
+                request,
+                NonCompliantDay.objects.filter(date=base_date).select_related("user"),
+                ("user_id",), page_size=20,
+            )
 
-        week_data = fetch_range(7)
-        month_data = fetch_range(30)
-        three_month_data = fetch_range(90)
-        six_month_data = fetch_range(180)
+        # Chart aggregations from the daily rollup's prefix sums
+        windows = rolling_compliance(base_date, (7, 30, 90, 180))
+        week_data, month_data = windows[7], windows[30]
+        three_month_data, six_month_data = windows[90], windows[180]
 
     return render(request, "myapp/spark_finch_users.html", {
         "selected_date": selected_date,
-        "users_from_api": users_from_db,
-        "page": page,
-        "pagination": pagination,
-        "has_previous": pagination.get("has_previous", False),
-        "has_more": pagination.get("has_next", False),
+        "users_from_api": [day.user.email for day in users_page["items"]] if users_page else [],
+        "page": users_page,
         "total_employees": total_employees,
         "non_compliant_users": non_compliant_users,
         "compliant_users": compliant_users,
@@ -776,13 +927,9 @@ def get_employee_context(user):
         'id', 'username', 'role', 'designation'
     ).distinct())
 
-    # 5️⃣ Get leave requests of those project members
-    leave_requests = list(LeaveRequest.objects.filter(
-        user__id__in=project_members
-    ).values(
-        'id', 'user_id', 'leave_type_id', 'start_date', 'end_date',
-        'reason', 'status', 'applied_at'
-    ).distinct())
+    # 5️⃣ How many of those project members are out each day (next 90 days)
+    today = date.today()
+    team_absence = team_absence_context(project_lead_ids, today, today + timedelta(days=90))
 
     current_user_projects = list(Project.objects.filter(id__in=project_ids).values(
         'id', 'name', 'description', 'status'
@@ -802,12 +949,10 @@ def get_employee_context(user):
         "leave_balance" : self_leave_balance,
         "self_leave_request" : self_leave_requests,
         "project_members" : users,
-        "leave_requests" : leave_requests
+        "team_absence" : team_absence
     }
     return context
 
-from django.db.models import Q
-
 def get_manager_reports_context(user):
     # 1️⃣ Get direct employees (manager=user)
     direct_ids = CustomUser.objects.filter(manager=user).values_list('id', flat=True)
@@ -832,6 +977,14 @@ def get_manager_reports_context(user):
         Q(user__id__in=direct_ids) | Q(user__id__in=project_members)
     ).values('id', 'user_id', 'leave_type_id', 'total', 'used', 'remaining').distinct())
 
+    # 🔹 Reports of reports (any depth): one summary row each instead of their full leave history
+    today = date.today()
+    skip_level = list(skip_level_reports(user).annotate(
+        pending_requests=Count('leaverequest', filter=Q(leaverequest__status='Pending')),
+        upcoming_leave_days=Sum('leaverequest__days', filter=Q(
+            leaverequest__status='Approved', leaverequest__end_date__gte=today
+        )),
+    ).values('id', 'username', 'role', 'manager_id', 'designation', 'pending_requests', 'upcoming_leave_days'))
 
     # 6️⃣ Projects — only those led by this manager (optional)
     projects = list(Project.objects.filter(lead=user).values(
@@ -858,13 +1011,8 @@ def get_manager_reports_context(user):
         'id', 'username', 'role', 'designation'
     ).distinct())
 
-    # 5️⃣ Get leave requests of those project members
-    co_working_leave_requests = list(LeaveRequest.objects.filter(
-        user__id__in=co_working_members
-    ).values(
-        'id', 'user_id', 'leave_type_id', 'start_date', 'end_date',
-        'reason', 'status', 'applied_at'
-    ).distinct())
+    # 5️⃣ How many co-workers are out each day (next 90 days)
+    co_working_absence = team_absence_context(project_lead_ids, today, today + timedelta(days=90))
 
     current_user=list(CustomUser.objects.filter(id=user.id).values('id', 'username', 'role', 'designation'))
     self_leave_balance = list(LeaveBalance.objects.filter(user=user).values(
@@ -883,10 +1031,11 @@ def get_manager_reports_context(user):
         "users": users,
         "leave_requests": leave_requests,
         "leave_balances": leave_balances,
+        "skip_level_reports": skip_level,
         "projects": projects,
         "project_members": project_members,
         "co-workers" : co_working_users,
-        "co-workers_leave_requests" : co_working_leave_requests
+        "co-workers_absence" : co_working_absence
     }
 
     return context
@@ -935,6 +1084,7 @@ def get_admin_reports_context(user):
     return context
 
 
+@query_budget(queries=15)
 @login_required
 def chat_bot(request):
     if request.method == "POST":
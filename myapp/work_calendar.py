@@ -0,0 +1,145 @@
+#work_calendar.py
+"""
+Working-day calendar.
+
+Holds a working-day bitmap (weekdays minus Holiday rows) and its prefix
+sums for a fixed span of years, so that counting the working days in any
+range is two array lookups, and counting thousands of ranges is one
+vectorised NumPy expression.
+"""
+import json
+import time
+from datetime import date, datetime, timedelta
+
+import numpy as np
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Holiday
+
+CALENDAR_START = date(2000, 1, 1)
+CALENDAR_END = date(2099, 12, 31)
+
+# Other worker processes pick up holiday edits after this many seconds.
+CALENDAR_TTL = 300
+
+
+class WorkingDayCalendar:
+    def __init__(self, holidays=(), start=CALENDAR_START, end=CALENDAR_END):
+        self.start = start
+        self.end = end
+        self._origin = start.toordinal()
+
+        n = (end - start).days + 1
+        # weekday() of CALENDAR_START, then Mon=0 ... Sun=6 for every day
+        weekdays = (np.arange(n) + start.weekday()) % 7
+        working = weekdays < 5
+
+        offsets = [(d - start).days for d in holidays if start <= d <= end]
+        if offsets:
+            working[np.asarray(offsets, dtype=np.int64)] = False
+
+        self.working = working
+        # prefix[i] = number of working days in [start, start + i)
+        self.prefix = np.concatenate(([0], np.cumsum(working, dtype=np.int64)))
+
+    def _index(self, day):
+        if not (self.start <= day <= self.end):
+            raise ValueError(f"{day} is outside the working-day calendar ({self.start} - {self.end})")
+        return day.toordinal() - self._origin
+
+    def is_working_day(self, day):
+        return bool(self.working[self._index(day)])
+
+    def count(self, start_date, end_date):
+        """Working days in [start_date, end_date], both inclusive. 0 if end < start."""
+        if end_date < start_date:
+            return 0
+        return int(self.prefix[self._index(end_date) + 1] - self.prefix[self._index(start_date)])
+
+    def count_many(self, start_dates, end_dates):
+        """Vectorised count() over two equal-length sequences of dates; returns an int array."""
+        starts = np.fromiter((d.toordinal() for d in start_dates), dtype=np.int64) - self._origin
+        ends = np.fromiter((d.toordinal() for d in end_dates), dtype=np.int64) - self._origin
+        if starts.size and (starts.min() < 0 or ends.max() >= len(self.working)):
+            raise ValueError("date range is outside the working-day calendar")
+        counts = self.prefix[ends + 1] - self.prefix[starts]
+        return np.where(ends < starts, 0, counts)
+
+    def shift(self, day, working_days):
+        """
+        The date `working_days` working days before (negative) or after
+        (positive) `day`, not counting `day` itself.
+        """
+        i = self._index(day)
+        if working_days < 0:
+            # last index j < i with prefix[i] - prefix[j] == -working_days
+            target = self.prefix[i] + working_days
+            j = int(np.searchsorted(self.prefix, target + 1, side="left")) - 1
+        else:
+            target = self.prefix[i + 1] + working_days
+            j = int(np.searchsorted(self.prefix, target, side="left")) - 1
+        if j < 0 or j >= len(self.working):
+            raise ValueError("shifted date is outside the working-day calendar")
+        return self.start + timedelta(days=j)
+
+
+_calendar = None
+_built_at = 0.0
+
+
+def get_calendar():
+    """Process-wide calendar, rebuilt when holidays change or the TTL expires."""
+    global _calendar, _built_at
+    if _calendar is None or time.monotonic() - _built_at > CALENDAR_TTL:
+        _calendar = WorkingDayCalendar(Holiday.objects.values_list("date", flat=True))
+        _built_at = time.monotonic()
+    return _calendar
+
+
+@receiver([post_save, post_delete], sender=Holiday)
+def _invalidate_calendar(sender, **kwargs):
+    global _calendar
+    _calendar = None
+
+
+def working_days(start_date, end_date):
+    """Working days in [start_date, end_date], both inclusive."""
+    return get_calendar().count(start_date, end_date)
+
+
+def working_days_many(ranges):
+    """Working days for a list of (start_date, end_date) pairs, as a list of ints."""
+    if not ranges:
+        return []
+    starts, ends = zip(*ranges)
+    return get_calendar().count_many(starts, ends).tolist()
+
+
+def merge_date_ranges(ranges):
+    """
+    Coalesce (start, end) date pairs that overlap or touch into a sorted
+    list of disjoint [start, end] ranges.
+    """
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + timedelta(days=1):
+            if end > merged[-1][1]:
+                merged[-1][1] = end
+        else:
+            merged.append([start, end])
+    return merged
+
+
+def dates_to_ranges(dates):
+    """Merged ranges from individual days (date objects or 'YYYY-MM-DD' strings)."""
+    days = [
+        datetime.strptime(d, "%Y-%m-%d").date() if isinstance(d, str) else d
+        for d in dates
+    ]
+    return merge_date_ranges((d, d) for d in days)
+
+
+def date_ranges_json(ranges):
+    """[["YYYY-MM-DD", "YYYY-MM-DD"], ...] for the calendar templates."""
+    return json.dumps([[start.isoformat(), end.isoformat()] for start, end in ranges])
@@ -5,6 +5,9 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
+
+Serve the app through this entry point (e.g. ``uvicorn myproject.asgi:application``)
+so the async notification stream holds no worker thread while it waits.
 """
 
 import os